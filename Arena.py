@@ -1,5 +1,8 @@
 import logging
+import math
+import multiprocessing
 
+import numpy as np
 from tqdm import tqdm
 
 log = logging.getLogger(__name__)
@@ -10,7 +13,7 @@ class Arena():
     An Arena class where any 2 agents can be pit against each other.
     """
 
-    def __init__(self, player1, player2, game, display=None):
+    def __init__(self, player1, player2, game, display=None, playerFactories=None):
         """
         Input:
             player 1,2: two functions that takes board as input, return action
@@ -18,6 +21,10 @@ class Arena():
             display: a function that takes board as input and prints it (e.g.
                      display in othello/OthelloGame). Is necessary for verbose
                      mode.
+            playerFactories: picklable functions without arguments that build
+                     player 1 and 2 in a worker process (e.g. an
+                     MCTSPlayerFactory loading a checkpoint). Is necessary for
+                     playGames with workers > 1.
 
         see othello/OthelloPlayers.py for an example. See pit.py for pitting
         human players/other baselines with each other.
@@ -26,6 +33,7 @@ class Arena():
         self.player2 = player2
         self.game = game
         self.display = display
+        self.playerFactories = playerFactories
 
     def playGame(self, verbose=False):
         """
@@ -78,16 +86,144 @@ class Arena():
             self.display(board)
         return curPlayer * self.game.getGameEnded(board, curPlayer)
 
-    def playGames(self, num, verbose=False):
+    def gameSteps(self, player1, player2):
+        """
+        A generator version of playGame for players with the steps method of
+        MCTSPlayer: yields (player, board) for every leaf board the player to
+        move needs evaluated, expects its (pi, v) to be sent back, and returns
+        the result of playGame.
+        """
+        players = [player2, None, player1]
+        curPlayer = 1
+        board = self.game.getInitBoard()
+
+        for player in players[0], players[2]:
+            if hasattr(player, "startGame"):
+                player.startGame()
+
+        while self.game.getGameEnded(board, curPlayer) == 0:
+            player = players[curPlayer + 1]
+            canonicalBoard = self.game.getCanonicalForm(board, curPlayer)
+            steps = player.steps(canonicalBoard)
+            try:
+                leaf = next(steps)
+                while True:
+                    leaf = steps.send((yield player, leaf))
+            except StopIteration as stop:
+                action = stop.value
+
+            valids = self.game.getValidMoves(canonicalBoard, 1)
+            if valids[action] == 0:
+                log.error(f'Action {action} is not valid!')
+                log.debug(f'valids = {valids}')
+                assert valids[action] > 0
+
+            opponent = players[-curPlayer + 1]
+            if hasattr(opponent, "notify"):
+                opponent.notify(board, action)
+
+            board, curPlayer = self.game.getNextState(board, curPlayer, action)
+
+        for player in players[0], players[2]:
+            if hasattr(player, "endGame"):
+                player.endGame()
+
+        return curPlayer * self.game.getGameEnded(board, curPlayer)
+
+    def playGamesBatched(self, num, batchSize):
+        """
+        playGames with up to batchSize games in flight, for players that have
+        the steps, clone and nnet of MCTSPlayer. Every game gets clones of the
+        players, and each step sends the leaf boards of all the games where a
+        network is to move to its predict_batch at once.
+
+        Every game gets its own np.random seed, drawn here, and runs with its
+        own random state, so its result is the one playGame gives after
+        seeding np.random with it, whatever the batchSize (for networks whose
+        predict_batch matches predict).
+
+        Returns:
+            oneWon: games won by player1
+            twoWon: games won by player2
+            draws:  games won by nobody
+        """
+        num = int(num / 2)
+        seeds = np.random.randint(2 ** 31, size=2 * num)
+        pending = list(zip([False] * num + [True] * num, seeds))[::-1]
+        games = []
+
+        oneWon = 0
+        twoWon = 0
+        draws = 0
+        randomState = np.random.get_state()
+        try:
+            with tqdm(total=2 * num, desc="Arena.playGamesBatched") as progress:
+                while games or pending:
+                    finished = []
+                    while len(games) + len(finished) < batchSize and pending:
+                        swapped, seed = pending.pop()
+                        player1, player2 = self.player1.clone(), self.player2.clone()
+                        steps = self.gameSteps(player2, player1) if swapped else self.gameSteps(player1, player2)
+                        game = {'steps': steps, 'swapped': swapped,
+                                'random': np.random.RandomState(seed).get_state()}
+                        (finished if self.resumeGame(game, None) else games).append(game)
+
+                    byNetwork = {}
+                    for game in games:
+                        player, _ = game['request']
+                        byNetwork.setdefault(id(player.nnet), []).append(game)
+                    for networkGames in byNetwork.values():
+                        nnet = networkGames[0]['request'][0].nnet
+                        pis, vs = nnet.predict_batch([game['request'][1] for game in networkGames])
+                        for game, pi, v in zip(networkGames, pis, vs):
+                            if self.resumeGame(game, (pi, v)):
+                                finished.append(game)
+
+                    for game in finished:
+                        if game['result'] == 1:
+                            oneWon += 1
+                        elif game['result'] == -1:
+                            twoWon += 1
+                        else:
+                            draws += 1
+                    progress.update(len(finished))
+                    games = [game for game in games if 'result' not in game]
+        finally:
+            np.random.set_state(randomState)
+        return oneWon, twoWon, draws
+
+    def resumeGame(self, game, message):
+        """
+        Sends message to a game of playGamesBatched, with the game's own random
+        state, and stores its next request, or its result from the point of
+        view of player1 once it ended.
+
+        Returns:
+            True if the game ended
+        """
+        np.random.set_state(game['random'])
+        try:
+            game['request'] = game['steps'].send(message)
+            return False
+        except StopIteration as stop:
+            game['result'] = -stop.value if game['swapped'] else stop.value
+            return True
+        finally:
+            game['random'] = np.random.get_state()
+
+    def playGames(self, num, verbose=False, workers=1):
         """
         Plays num games in which player1 starts num/2 games and player2 starts
-        num/2 games.
+        num/2 games. With workers > 1 the games are spread over a pool of that
+        many processes, which build their own players with playerFactories.
 
         Returns:
             oneWon: games won by player1
             twoWon: games won by player2
             draws:  games won by nobody
         """
+        if workers > 1:
+            return self.playGamesParallel(num, workers, verbose=verbose)
 
         num = int(num / 2)
         oneWon = 0
@@ -114,3 +250,108 @@ class Arena():
                 draws += 1
 
         return oneWon, twoWon, draws
+
+    def playGamesSPRT(self, num, p0, p1, alpha=0.05, beta=0.05, verbose=False):
+        """
+        Plays up to num games, alternating the player that starts, and stops
+        as soon as a sequential probability ratio test decides between H0:
+        player1 wins a share p0 of the decided games, and H1: it wins a share
+        p1 > p0, with error rates alpha (accepting H1 wrongly) and beta
+        (accepting H0 wrongly). Draws carry no evidence.
+
+        Returns:
+            oneWon, twoWon, draws: as playGames
+            llr: the final log likelihood ratio of H1 over H0, see sprtBounds
+        """
+        lower, upper = sprtBounds(alpha, beta)
+        winLlr, lossLlr = math.log(p1 / p0), math.log((1 - p1) / (1 - p0))
+        oneWon = 0
+        twoWon = 0
+        draws = 0
+        llr = 0.
+        for i in tqdm(range(num), desc="Arena.playGamesSPRT"):
+            if i % 2 == 0:
+                gameResult = self.playGame(verbose=verbose)
+            else:
+                self.player1, self.player2 = self.player2, self.player1
+                try:
+                    gameResult = -self.playGame(verbose=verbose)
+                finally:
+                    self.player1, self.player2 = self.player2, self.player1
+            if gameResult == 1:
+                oneWon += 1
+                llr += winLlr
+            elif gameResult == -1:
+                twoWon += 1
+                llr += lossLlr
+            else:
+                draws += 1
+            if llr >= upper or llr <= lower:
+                break
+        return oneWon, twoWon, draws, llr
+
+    def playGamesParallel(self, num, workers, verbose=False):
+        """
+        playGames in a pool of worker processes. Every game gets its own seed
+        for np.random, drawn here, so the workers do not repeat each other's
+        games and a seeded run is reproducible.
+        """
+        if self.playerFactories is None:
+            raise ValueError('Arena.playGames with workers > 1 needs playerFactories')
+        num = int(num / 2)
+        seeds = np.random.randint(2 ** 31, size=2 * num)
+        games = [(swapped, seed, verbose) for swapped, seed in zip([False] * num + [True] * num, seeds)]
+
+        oneWon = 0
+        twoWon = 0
+        draws = 0
+        with multiprocessing.Pool(workers, initializer=initArenaWorker,
+                                  initargs=(self.game, self.playerFactories, self.display)) as pool:
+            for gameResult in tqdm(pool.imap_unordered(playArenaGame, games), total=len(games),
+                                   desc="Arena.playGames"):
+                if gameResult == 1:
+                    oneWon += 1
+                elif gameResult == -1:
+                    twoWon += 1
+                else:
+                    draws += 1
+        return oneWon, twoWon, draws
+
+
+def sprtBounds(alpha, beta):
+    """
+    Returns:
+        lower, upper: the log likelihood ratios of Arena.playGamesSPRT at or
+                      below which H0 is accepted, and at or above which H1 is
+                      accepted
+    """
+    return math.log(beta / (1 - alpha)), math.log((1 - beta) / alpha)
+
+
+# the game and players of an Arena.playGames worker process
+arenaWorker = {}
+
+
+def initArenaWorker(game, playerFactories, display):
+    """
+    Pool initializer of Arena.playGamesParallel: builds both players once per
+    worker process.
+    """
+    arenaWorker.update(game=game, players=[makePlayer() for makePlayer in playerFactories], display=display)
+
+
+def playArenaGame(game):
+    """
+    Plays one game (swapped, seed, verbose) in an Arena.playGames worker,
+    started by player2 if swapped.
+
+    Returns:
+        the result of the game from the point of view of player1, as returned
+        by Arena.playGame
+    """
+    swapped, seed, verbose = game
+    player1, player2 = arenaWorker['players']
+    np.random.seed(seed)
+    if swapped:
+        return -Arena(player2, player1, arenaWorker['game'], arenaWorker['display']).playGame(verbose=verbose)
+    return Arena(player1, player2, arenaWorker['game'], arenaWorker['display']).playGame(verbose=verbose)
@@ -0,0 +1,89 @@
+from collections import OrderedDict
+
+from NeuralNet import NeuralNet
+
+
+class CachedNNet(NeuralNet):
+    """
+    This class wraps a NeuralNet and keeps the (pi, v) of the last maxSize
+    boards it evaluated, keyed by game.stringRepresentation of the canonical
+    board, evicting the least recently used one when full. Every MCTS given
+    the same CachedNNet shares the cache, e.g. all the self-play episodes and
+    Arena games of one network version.
+
+    The cache is cleared whenever the weights change through train or
+    load_checkpoint. Other attributes are looked up on the wrapped network.
+    """
+
+    def __init__(self, game, nnet, maxSize):
+        self.game = game
+        self.nnet = nnet
+        self.maxSize = maxSize
+        self.cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __getattr__(self, name):
+        if name == 'nnet':
+            raise AttributeError(name)
+        return getattr(self.nnet, name)
+
+    def hitRate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.
+
+    def clear(self):
+        self.cache.clear()
+
+    def lookup(self, s):
+        if s in self.cache:
+            self.hits += 1
+            self.cache.move_to_end(s)
+            return self.cache[s]
+        self.misses += 1
+        return None
+
+    def store(self, s, pi, v):
+        self.cache[s] = (pi, v)
+        if len(self.cache) > self.maxSize:
+            self.cache.popitem(last=False)
+            self.evictions += 1
+
+    def predict(self, board):
+        s = self.game.stringRepresentation(board)
+        result = self.lookup(s)
+        if result is None:
+            result = self.nnet.predict(board)
+            self.store(s, *result)
+        return result
+
+    def predict_batch(self, boards):
+        """
+        Evaluates the boards missing from the cache in one nnet.predict_batch
+        call.
+        """
+        keys = [self.game.stringRepresentation(board) for board in boards]
+        results = [self.lookup(s) for s in keys]
+        missing = [i for i, result in enumerate(results) if result is None]
+        if missing:
+            pis, vs = self.nnet.predict_batch([boards[i] for i in missing])
+            for i, pi, v in zip(missing, pis, vs):
+                results[i] = (pi, v)
+                self.store(keys[i], pi, v)
+        return [pi for pi, _ in results], [v for _, v in results]
+
+    def train(self, examples):
+        try:
+            return self.nnet.train(examples)
+        finally:
+            self.clear()
+
+    def save_checkpoint(self, folder, filename):
+        return self.nnet.save_checkpoint(folder, filename)
+
+    def load_checkpoint(self, folder, filename):
+        try:
+            return self.nnet.load_checkpoint(folder, filename)
+        finally:
+            self.clear()
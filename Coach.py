@@ -1,15 +1,20 @@
 import logging
+import multiprocessing
 import os
+import queue
 import sys
-from collections import deque
+import time
+from collections import Counter, deque
 from pickle import Pickler, Unpickler
 from random import shuffle
 
 import numpy as np
 from tqdm import tqdm
 
-from Arena import Arena
-from MCTS import MCTS
+from Arena import Arena, sprtBounds
+from CachedNNet import CachedNNet
+from MCTS import MCTS, MCTSPlayer, MCTSPlayerFactory
+from ReplayBuffer import DedupExamples, ReplayArrays, ReplayBuffer, Shard, SymmetricExamples
 
 log = logging.getLogger(__name__)
 
@@ -23,10 +28,19 @@ class Coach():
     def __init__(self, game, nnet, args):
         self.game = game
         self.nnet = nnet
+        self.nnetClass = nnet.__class__
         self.pnet = self.nnet.__class__(self.game)  # the competitor network
         self.args = args
+        if args.get('evalCacheSize', 0) > 0:
+            # share the network evaluations between the episodes and arena games of a network version
+            self.nnet = CachedNNet(game, self.nnet, args.evalCacheSize)
+            self.pnet = CachedNNet(game, self.pnet, args.evalCacheSize)
         self.mcts = MCTS(self.game, self.nnet, self.args)
         self.trainExamplesHistory = []  # history of examples from args.numItersForTrainExamplesHistory latest iterations
+        self.replayBuffer = None
+        if args.get('replayShards', False):
+            # every iteration writes its examples once instead of pickling the history
+            self.replayBuffer = ReplayBuffer(os.path.join(args.checkpoint, 'replay'))
         self.skipFirstSelfPlay = False  # can be overriden in loadTrainExamples()
 
     def executeEpisode(self):
@@ -38,7 +52,8 @@ class Coach():
         in trainExamples.
 
         It uses a temp=1 if episodeStep < tempThreshold, and thereafter
-        uses temp=0.
+        uses temp=0. With args.gumbel set, every move is the action chosen by
+        the Gumbel search and pi is its improved policy.
 
         Returns:
             trainExamples: a list of examples of the form (canonicalBoard, currPlayer, pi,v)
@@ -55,12 +70,18 @@ class Coach():
             canonicalBoard = self.game.getCanonicalForm(board, self.curPlayer)
             temp = int(episodeStep < self.args.tempThreshold)
 
-            pi = self.mcts.getActionProb(canonicalBoard, temp=temp)
-            sym = self.game.getSymmetries(canonicalBoard, pi)
+            if self.args.get('gumbel', False):
+                # learn the improved policy, play the action chosen with Gumbel noise
+                pi = self.mcts.getActionProb(canonicalBoard, temp=1)
+                action = self.mcts.selectedAction
+            else:
+                pi = self.mcts.getActionProb(canonicalBoard, temp=temp)
+                action = np.random.choice(len(pi), p=pi)
+            sym = self.getSymmetries(canonicalBoard, pi)
             for b, p in sym:
                 trainExamples.append([b, self.curPlayer, p, None])
 
-            action = np.random.choice(len(pi), p=pi)
+            self.mcts.advance(action)
             board, self.curPlayer = self.game.getNextState(board, self.curPlayer, action)
 
             r = self.game.getGameEnded(board, self.curPlayer)
@@ -68,6 +89,84 @@ class Coach():
             if r != 0:
                 return [(x[0], x[2], r * ((-1) ** (x[1] != self.curPlayer))) for x in trainExamples]
 
+    def episodeSteps(self, mcts):
+        """
+        A generator version of executeEpisode (without args.gumbel) that
+        searches with mcts.getActionProbSteps: it yields the boards to
+        evaluate, expects their (pi, v) to be sent back, and returns the
+        trainExamples of executeEpisode.
+        """
+        trainExamples = []
+        board = self.game.getInitBoard()
+        curPlayer = 1
+        episodeStep = 0
+
+        while True:
+            episodeStep += 1
+            canonicalBoard = self.game.getCanonicalForm(board, curPlayer)
+            temp = int(episodeStep < self.args.tempThreshold)
+
+            pi = yield from mcts.getActionProbSteps(canonicalBoard, temp=temp)
+            sym = self.getSymmetries(canonicalBoard, pi)
+            for b, p in sym:
+                trainExamples.append([b, curPlayer, p, None])
+
+            action = np.random.choice(len(pi), p=pi)
+            mcts.advance(action)
+            board, curPlayer = self.game.getNextState(board, curPlayer, action)
+
+            r = self.game.getGameEnded(board, curPlayer)
+
+            if r != 0:
+                return [(x[0], x[2], r * ((-1) ** (x[1] != curPlayer))) for x in trainExamples]
+
+    def executeEpisodes(self, numEpisodes):
+        """
+        Plays numEpisodes episodes of self-play, args.selfPlayBatchSize of
+        them at a time in lockstep: every step runs one simulation of each
+        game's search, and the leaves of all the games are evaluated in a
+        single nnet.predict_batch call. A finished game is replaced by a new
+        one until numEpisodes were started.
+
+        Yields:
+            trainExamples: the examples of every finished episode, as returned
+                           by executeEpisode
+        """
+        batchSize = self.args.get('selfPlayBatchSize', 1)
+        episodes = []  # (generator, leaf board) of the games in progress
+        started = 0
+        while episodes or started < numEpisodes:
+            while len(episodes) < batchSize and started < numEpisodes:
+                episode = self.episodeSteps(MCTS(self.game, self.nnet, self.args))
+                episodes.append((episode, next(episode)))
+                started += 1
+
+            pis, vs = self.nnet.predict_batch([board for _, board in episodes])
+            running = []
+            for (episode, _), pi, v in zip(episodes, pis, vs):
+                try:
+                    running.append((episode, episode.send((pi, v))))
+                except StopIteration as stop:
+                    yield stop.value
+            episodes = running
+
+    def executeEpisodesParallel(self, numEpisodes, seed=0):
+        """
+        Plays numEpisodes episodes of self-play with executeEpisode in a pool
+        of args.numSelfPlayWorkers processes, which load the current network
+        from a checkpoint once. Episode k seeds np.random with seed + k, so
+        the episodes do not depend on the worker that plays them.
+
+        Yields:
+            trainExamples: the examples of every episode, as it finishes
+        """
+        filename = 'selfplay.pth.tar'
+        self.nnet.save_checkpoint(folder=self.args.checkpoint, filename=filename)
+        initargs = (self.game, self.nnetClass, self.args.checkpoint, filename, self.args)
+        with multiprocessing.Pool(self.args.numSelfPlayWorkers, initializer=initSelfPlayWorker,
+                                  initargs=initargs) as pool:
+            yield from pool.imap_unordered(selfPlayEpisode, range(seed, seed + numEpisodes))
+
     def learn(self):
         """
         Performs numIters iterations with numEps episodes of self-play in each
@@ -82,11 +181,23 @@ class Coach():
             log.info(f'Starting Iter #{i} ...')
             # examples of the iteration
             if not self.skipFirstSelfPlay or i > 1:
-                iterationTrainExamples = deque([], maxlen=self.args.maxlenOfQueue)
+                iterationTrainExamples = deque([], maxlen=self.getMaxlenOfQueue())
 
-                for _ in tqdm(range(self.args.numEps), desc="Self Play"):
-                    self.mcts = MCTS(self.game, self.nnet, self.args)  # reset search tree
-                    iterationTrainExamples += self.executeEpisode()
+                if self.args.get('numSelfPlayWorkers', 1) > 1:
+                    for trainExamples in tqdm(self.executeEpisodesParallel(self.args.numEps, seed=i * self.args.numEps),
+                                              total=self.args.numEps, desc="Self Play"):
+                        iterationTrainExamples += trainExamples
+                elif self.args.get('selfPlayBatchSize', 1) > 1 and not self.args.get('gumbel', False):
+                    for trainExamples in tqdm(self.executeEpisodes(self.args.numEps), total=self.args.numEps,
+                                              desc="Self Play"):
+                        iterationTrainExamples += trainExamples
+                else:
+                    for _ in tqdm(range(self.args.numEps), desc="Self Play"):
+                        self.mcts = MCTS(self.game, self.nnet, self.args)  # reset search tree
+                        iterationTrainExamples += self.executeEpisode()
+
+                if isinstance(self.nnet, CachedNNet):
+                    log.info(f'Evaluation cache: {self.nnet.hitRate():.1%} hits, {self.nnet.evictions} evictions')
 
                 # save the iteration examples to the history 
                 self.trainExamplesHistory.append(iterationTrainExamples)
@@ -99,27 +210,21 @@ class Coach():
             # NB! the examples were collected using the model from the previous iteration, so (i-1)  
             self.saveTrainExamples(i - 1)
 
-            # shuffle examples before training
-            trainExamples = []
-            for e in self.trainExamplesHistory:
-                trainExamples.extend(e)
-            shuffle(trainExamples)
+            trainExamples = self.getTrainExamples()
 
             # training new network, keeping a copy of the old one
             self.nnet.save_checkpoint(folder=self.args.checkpoint, filename='temp.pth.tar')
             self.pnet.load_checkpoint(folder=self.args.checkpoint, filename='temp.pth.tar')
-            pmcts = MCTS(self.game, self.pnet, self.args)
+            pplayer = MCTSPlayer(self.game, self.pnet, self.args)
 
             self.nnet.train(trainExamples)
-            nmcts = MCTS(self.game, self.nnet, self.args)
+            nplayer = MCTSPlayer(self.game, self.nnet, self.args)
 
             log.info('PITTING AGAINST PREVIOUS VERSION')
-            arena = Arena(lambda x: np.argmax(pmcts.getActionProb(x, temp=0)),
-                          lambda x: np.argmax(nmcts.getActionProb(x, temp=0)), self.game)
-            pwins, nwins, draws = arena.playGames(self.args.arenaCompare)
-
-            log.info('NEW/PREV WINS : %d / %d ; DRAWS : %d' % (nwins, pwins, draws))
-            if pwins + nwins == 0 or float(nwins) / (pwins + nwins) < self.args.updateThreshold:
+            if self.args.get('numArenaWorkers', 1) > 1 and not self.args.get('sprt', False):
+                # the arena workers load both networks from checkpoints
+                self.nnet.save_checkpoint(folder=self.args.checkpoint, filename=self.getCandidateFile(i))
+            if not self.pit(pplayer, nplayer, ('temp.pth.tar', self.getCandidateFile(i))):
                 log.info('REJECTING NEW MODEL')
                 self.nnet.load_checkpoint(folder=self.args.checkpoint, filename='temp.pth.tar')
             else:
@@ -127,10 +232,191 @@ class Coach():
                 self.nnet.save_checkpoint(folder=self.args.checkpoint, filename=self.getCheckpointFile(i))
                 self.nnet.save_checkpoint(folder=self.args.checkpoint, filename='best.pth.tar')
 
+    def playerFactory(self, filename):
+        return MCTSPlayerFactory(self.game, self.nnetClass, self.args.checkpoint, filename, self.args)
+
+    def pit(self, pplayer, nplayer, checkpoints):
+        """
+        Pits the new player against the previous one, in arenaCompare games
+        spread over args.numArenaWorkers processes that load the previous and
+        new network from the given checkpoints. With args.sprt the games are
+        played one at a time until a sequential probability ratio test of
+        H0: the new network wins a share sprtP0 (0.5) of the decided games,
+        against H1: it wins a share sprtP1 (updateThreshold), decides at error
+        rates sprtAlpha and sprtBeta (0.05). If arenaCompare games decide
+        neither, acceptNewModel does.
+
+        Returns:
+            True if the new network is accepted
+        """
+        if self.args.get('sprt', False):
+            alpha, beta = self.args.get('sprtAlpha', 0.05), self.args.get('sprtBeta', 0.05)
+            arena = Arena(nplayer, pplayer, self.game)
+            nwins, pwins, draws, llr = arena.playGamesSPRT(self.args.arenaCompare, self.args.get('sprtP0', 0.5),
+                                                           self.args.get('sprtP1', self.args.updateThreshold),
+                                                           alpha, beta)
+            lower, upper = sprtBounds(alpha, beta)
+            log.info(f'SPRT: {nwins + pwins + draws} games, log likelihood ratio {llr:.3f} '
+                     f'(reject <= {lower:.3f}, accept >= {upper:.3f})')
+            log.info('NEW/PREV WINS : %d / %d ; DRAWS : %d' % (nwins, pwins, draws))
+            if llr >= upper or llr <= lower:
+                return llr >= upper
+            return self.acceptNewModel(pwins, nwins, draws)
+
+        arena = Arena(pplayer, nplayer, self.game, playerFactories=[self.playerFactory(f) for f in checkpoints])
+        pwins, nwins, draws = arena.playGames(self.args.arenaCompare, workers=self.args.get('numArenaWorkers', 1))
+        log.info('NEW/PREV WINS : %d / %d ; DRAWS : %d' % (nwins, pwins, draws))
+        return self.acceptNewModel(pwins, nwins, draws)
+
+    def acceptNewModel(self, pwins, nwins, draws):
+        """
+        Returns True if the new network won at least updateThreshold of the
+        decided arena games.
+        """
+        return pwins + nwins > 0 and float(nwins) / (pwins + nwins) >= self.args.updateThreshold
+
+    def learnAsync(self):
+        """
+        Like learn, but self-play, training and gating overlap. max(1,
+        numSelfPlayWorkers) processes keep playing episodes with the best
+        network, this process trains on the replay buffer every numEps new
+        episodes and hands the trained network to a gating process as a
+        candidate, which pits it against the best network and publishes it as
+        the new best if accepted.
+
+        Network versions: version 0 is the initial network and version i the
+        candidate trained in iteration i, saved as getCheckpointFile(i) once
+        accepted. A self-play worker switches to a new best version only
+        between episodes, so every episode is played by one version, which is
+        sent along with its examples. Episodes of a version more than
+        args.maxVersionLag (default 1) iterations older than the current best
+        are dropped. The trainer always continues from its own latest
+        candidate, accepted or not.
+        """
+        folder = self.args.checkpoint
+        maxVersionLag = self.args.get('maxVersionLag', 1)
+        self.nnet.save_checkpoint(folder=folder, filename=self.getCheckpointFile(0))
+
+        bestVersion = multiprocessing.Value('i', 0)
+        episodes = multiprocessing.Queue(maxsize=self.args.numEps)
+        candidates = multiprocessing.Queue()
+        stop = multiprocessing.Event()
+        workers = [multiprocessing.Process(target=selfPlayLoop, daemon=True,
+                                           args=(self.game, self.nnetClass, self.args, bestVersion, episodes, stop, seed))
+                   for seed in range(max(1, self.args.get('numSelfPlayWorkers', 1)))]
+        gater = multiprocessing.Process(target=gatingLoop,
+                                        args=(self.game, self.nnetClass, self.args, bestVersion, candidates))
+        for process in workers + [gater]:
+            process.start()
+
+        try:
+            for i in range(1, self.args.numIters + 1):
+                log.info(f'Starting Iter #{i} ...')
+                if not self.skipFirstSelfPlay or i > 1:
+                    iterationTrainExamples = deque([], maxlen=self.getMaxlenOfQueue())
+                    numEpisodes, used, dropped = 0, Counter(), 0
+                    with tqdm(total=self.args.numEps, desc="Self Play") as progress:
+                        while numEpisodes < self.args.numEps:
+                            version, trainExamples = episodes.get()
+                            if version < bestVersion.value - maxVersionLag:
+                                dropped += 1
+                                continue
+                            iterationTrainExamples += trainExamples
+                            used[version] += 1
+                            numEpisodes += 1
+                            progress.update()
+                    log.info(f'Episodes per network version: {dict(used)}, dropped as stale: {dropped}')
+                    self.trainExamplesHistory.append(iterationTrainExamples)
+
+                if len(self.trainExamplesHistory) > self.args.numItersForTrainExamplesHistory:
+                    log.warning(
+                        f"Removing the oldest entry in trainExamples. len(trainExamplesHistory) = {len(self.trainExamplesHistory)}")
+                    self.trainExamplesHistory.pop(0)
+                self.saveTrainExamples(i - 1)
+
+                trainExamples = self.getTrainExamples()
+
+                self.nnet.train(trainExamples)
+                self.nnet.save_checkpoint(folder=folder, filename=self.getCandidateFile(i))
+                candidates.put(i)
+        finally:
+            # let the gating process finish the last candidate, self-play is simply abandoned
+            candidates.put(None)
+            gater.join()
+            stop.set()
+            for worker in workers:
+                worker.terminate()
+                worker.join()
+        return bestVersion.value
+
+    def getSymmetries(self, canonicalBoard, pi):
+        """
+        Returns the examples to store for a position: all the symmetric forms
+        of game.getSymmetries, or with args.lazySymmetries just the position
+        itself, which getTrainExamples expands into its symmetries on access.
+        """
+        if self.args.get('lazySymmetries', False):
+            return [(canonicalBoard, pi)]
+        return self.game.getSymmetries(canonicalBoard, pi)
+
+    def getMaxlenOfQueue(self):
+        """
+        Returns the number of examples kept per iteration, maxlenOfQueue, in
+        positions rather than symmetric forms with args.lazySymmetries.
+        """
+        if self.args.get('lazySymmetries', False):
+            board = self.game.getInitBoard()
+            return self.args.maxlenOfQueue // len(self.game.getSymmetries(board, np.zeros(self.game.getActionSize())))
+        return self.args.maxlenOfQueue
+
+    def getTrainExamples(self):
+        """
+        Returns the examples of trainExamplesHistory to train on: a
+        ReplayArrays over the memory-mapped shards if all of the history is
+        in the replay buffer, else a shuffled list. With args.dedupExamples
+        the duplicate positions are merged by DedupExamples, if the network
+        weights its losses by examples.weights (NeuralNet.weightedTraining),
+        and with args.lazySymmetries the examples are wrapped into
+        SymmetricExamples.
+        """
+        if self.trainExamplesHistory and all(isinstance(e, Shard) for e in self.trainExamplesHistory):
+            trainExamples = ReplayArrays(self.trainExamplesHistory)
+        else:
+            trainExamples = []
+            for e in self.trainExamplesHistory:
+                trainExamples.extend(e)
+            shuffle(trainExamples)
+        if self.args.get('dedupExamples', False):
+            if getattr(self.nnet, 'weightedTraining', False):
+                trainExamples = self.dedupExamples(trainExamples)
+            else:
+                # the merged examples would count once each, overweighting the rare positions
+                log.warning(f'{type(self.nnet).__name__} ignores example weights, training without dedupExamples')
+        if self.args.get('lazySymmetries', False):
+            return SymmetricExamples(self.game, trainExamples)
+        return trainExamples
+
+    def dedupExamples(self, trainExamples):
+        """
+        Returns DedupExamples of trainExamples, and logs the share of unique
+        positions in the newest iteration and in the whole training set.
+        """
+        dedup = DedupExamples(trainExamples)
+        newest = self.trainExamplesHistory[-1]
+        unique = len(DedupExamples(newest))
+        log.info(f'Unique positions: {unique} of {len(newest)} ({unique / max(1, len(newest)):.1%}) in the newest '
+                 f'iteration, {len(dedup)} of {dedup.numRaw} ({len(dedup) / max(1, dedup.numRaw):.1%}) in the training set')
+        return dedup
+
+    def getCandidateFile(self, iteration):
+        return 'candidate_' + str(iteration) + '.pth.tar'
+
     def getCheckpointFile(self, iteration):
         return 'checkpoint_' + str(iteration) + '.pth.tar'
 
     def saveTrainExamples(self, iteration):
+        if self.replayBuffer is not None:
+            return self.saveTrainExampleShards()
         folder = self.args.checkpoint
         if not os.path.exists(folder):
             os.makedirs(folder)
@@ -139,7 +425,27 @@ class Coach():
             Pickler(f).dump(self.trainExamplesHistory)
         f.closed
 
+    def saveTrainExampleShards(self):
+        """
+        Writes the newest entry of trainExamplesHistory to the replay buffer,
+        unless it was written already, replacing it with the Shard reading it,
+        and removes the shards that left the history.
+        """
+        if self.trainExamplesHistory and not isinstance(self.trainExamplesHistory[-1], Shard):
+            start = time.time()
+            shard = self.replayBuffer.addShard(self.trainExamplesHistory[-1])
+            self.trainExamplesHistory[-1] = shard
+            log.info(f'Wrote {len(shard)} examples to {shard.prefix}: '
+                     f'{shard.nbytes() / 2 ** 20:.1f} MB in {time.time() - start:.2f} s')
+
+        kept = {e.prefix for e in self.trainExamplesHistory if isinstance(e, Shard)}
+        for prefix in self.replayBuffer.shards():
+            if prefix not in kept:
+                self.replayBuffer.removeShard(prefix)
+
     def loadTrainExamples(self):
+        if self.replayBuffer is not None:
+            return self.loadTrainExampleShards()
         modelFile = os.path.join(self.args.load_folder_file[0], self.args.load_folder_file[1])
         examplesFile = modelFile + ".examples"
         if not os.path.isfile(examplesFile):
@@ -155,3 +461,101 @@ class Coach():
 
             # examples based on the model were already collected (loaded)
             self.skipFirstSelfPlay = True
+
+    def loadTrainExampleShards(self):
+        """
+        Reads the newest numItersForTrainExamplesHistory shards of the replay
+        buffer in load_folder_file[0]/replay. They are memory-mapped, not
+        loaded into RAM.
+        """
+        folder = os.path.join(self.args.load_folder_file[0], 'replay')
+        prefixes = ReplayBuffer(folder).shards()[-self.args.numItersForTrainExamplesHistory:]
+        if not prefixes:
+            log.warning(f'No trainExamples shards found in "{folder}"!')
+            r = input("Continue? [y|n]")
+            if r != "y":
+                sys.exit()
+        else:
+            self.trainExamplesHistory = [Shard(prefix) for prefix in prefixes]
+            log.info(f'Loaded {sum(len(e) for e in self.trainExamplesHistory)} examples from {len(prefixes)} shards')
+
+            # examples based on the model were already collected (loaded)
+            self.skipFirstSelfPlay = True
+
+
+# the Coach of a self-play worker process
+selfPlayWorker = {}
+
+
+def initSelfPlayWorker(game, nnetClass, folder, filename, args):
+    """
+    Pool initializer of Coach.executeEpisodesParallel: builds the network once
+    per worker process and loads the checkpoint of the current iteration.
+    """
+    nnet = nnetClass(game)
+    nnet.load_checkpoint(folder, filename)
+    selfPlayWorker['coach'] = Coach(game, nnet, args)
+
+
+def selfPlayEpisode(seed):
+    """
+    Plays one episode of self-play in a worker of Coach.executeEpisodesParallel,
+    with np.random seeded by seed.
+    """
+    coach = selfPlayWorker['coach']
+    np.random.seed(seed)
+    coach.mcts = MCTS(coach.game, coach.nnet, coach.args)
+    return coach.executeEpisode()
+
+
+def selfPlayLoop(game, nnetClass, args, bestVersion, episodes, stop, seed):
+    """
+    Self-play process of Coach.learnAsync: plays episodes with the best
+    network version until stop is set, and puts (version, trainExamples) of
+    every episode into the episodes queue.
+    """
+    np.random.seed(seed)  # forked workers would otherwise share the random state
+    coach = Coach(game, nnetClass(game), args)
+    version = None
+    while not stop.is_set():
+        if version != bestVersion.value:
+            version = bestVersion.value
+            coach.nnet.load_checkpoint(args.checkpoint, coach.getCheckpointFile(version))
+        coach.mcts = MCTS(game, coach.nnet, args)
+        episodes.put((version, coach.executeEpisode()))
+
+
+def gatingLoop(game, nnetClass, args, bestVersion, candidates):
+    """
+    Gating process of Coach.learnAsync: pits the latest candidate of the
+    candidates queue against the best network, and publishes it as the best
+    version if accepted. Candidates superseded while a match was running are
+    skipped. Returns when it gets None.
+    """
+    coach = Coach(game, nnetClass(game), args)
+    done = False
+    while not done:
+        iteration = candidates.get()
+        while iteration is not None:
+            try:
+                latest = candidates.get_nowait()
+            except queue.Empty:
+                break
+            if latest is None:
+                done = True
+                break
+            iteration = latest
+        if iteration is None:
+            return
+
+        coach.pnet.load_checkpoint(args.checkpoint, coach.getCheckpointFile(bestVersion.value))
+        coach.nnet.load_checkpoint(args.checkpoint, coach.getCandidateFile(iteration))
+        log.info(f'PITTING CANDIDATE {iteration} AGAINST VERSION {bestVersion.value}')
+        if coach.pit(MCTSPlayer(game, coach.pnet, args), MCTSPlayer(game, coach.nnet, args),
+                     (coach.getCheckpointFile(bestVersion.value), coach.getCandidateFile(iteration))):
+            log.info(f'ACCEPTING CANDIDATE {iteration}')
+            coach.nnet.save_checkpoint(folder=args.checkpoint, filename=coach.getCheckpointFile(iteration))
+            coach.nnet.save_checkpoint(folder=args.checkpoint, filename='best.pth.tar')
+            bestVersion.value = iteration
+        else:
+            log.info(f'REJECTING CANDIDATE {iteration}')
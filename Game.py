@@ -111,3 +111,21 @@ class Game():
                          Required by MCTS for hashing.
         """
         pass
+
+    def getHashKey(self, board, parentBoard=None, parentKey=None, action=None):
+        """
+        Optional. If it returns a key, MCTS uses it instead of
+        stringRepresentation to identify boards.
+
+        Input:
+            board: current board in its canonical form
+            parentBoard: if given, the canonical board that board was reached
+                         from by action
+            parentKey: the key of parentBoard, which the key of board can be
+                       updated from
+
+        Returns:
+            key: an integer that identifies board (e.g. a Zobrist key, see
+                 utils.Zobrist), or None to use stringRepresentation
+        """
+        return None
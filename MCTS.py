@@ -1,5 +1,8 @@
 import logging
 import math
+import sys
+import threading
+import time
 
 import numpy as np
 
@@ -8,6 +11,130 @@ EPS = 1e-8
 log = logging.getLogger(__name__)
 
 
+def probsFromCounts(counts, temp=1):
+    """
+    Returns:
+        probs: a policy vector where the probability of the ith action is
+               proportional to counts[i]**(1./temp). For temp=0 all the
+               probability goes to one of the most visited actions, chosen
+               at random.
+    """
+    if temp == 0:
+        bestAs = np.array(np.argwhere(counts == np.max(counts))).flatten()
+        bestA = np.random.choice(bestAs)
+        probs = [0] * len(counts)
+        probs[bestA] = 1
+        return probs
+
+    counts = [x ** (1. / temp) for x in counts]
+    counts_sum = float(sum(counts))
+    probs = [x / counts_sum for x in counts]
+    return probs
+
+
+class NodeTable():
+    """
+    This class stores the statistics of the MCTS nodes. Every board gets an
+    integer node id the first time it is seen, and its per-action statistics
+    live in row id of contiguous NumPy arrays of width game.getActionSize().
+    The arrays double in size whenever they are full.
+    """
+
+    def __init__(self, actionSize, capacity=64):
+        self.actionSize = actionSize
+        self.ids = {}  # maps the string representation of a board to its node id
+        self.keys = []  # the string representation of the board of every node id
+        self.size = 0  # number of nodes in use
+        self.keyBytes = 0  # number of bytes taken by the keys
+
+        self.Qsa = np.zeros((capacity, actionSize), dtype=np.float32)  # stores Q values for s,a (as defined in the paper)
+        self.Nsa = np.zeros((capacity, actionSize), dtype=np.int32)  # stores #times edge s,a was visited
+        self.Ps = np.zeros((capacity, actionSize), dtype=np.float32)  # stores initial policy (returned by neural net)
+        self.Vs = np.zeros((capacity, actionSize), dtype=np.bool_)  # stores game.getValidMoves for board s
+        self.children = np.full((capacity, actionSize), -1, dtype=np.int32)  # stores the node id reached by edge s,a
+
+        self.Ns = np.zeros(capacity, dtype=np.int32)  # stores #times board s was visited
+        self.Es = np.zeros(capacity, dtype=np.float64)  # stores game.getGameEnded ended for board s
+        self.expanded = np.zeros(capacity, dtype=np.bool_)  # whether Ps and Vs were set for board s
+        self.visited = np.zeros(capacity, dtype=np.int64)  # the simulation that last visited board s
+
+    def __len__(self):
+        return self.size
+
+    def add(self, s, ended):
+        """
+        Creates the node for the board with string representation s and
+        game.getGameEnded value ended.
+
+        Returns:
+            node: the id of the new node
+        """
+        if self.size == len(self.Ns):
+            self.grow()
+        node = self.size
+        self.size += 1
+        self.ids[s] = node
+        self.keys.append(s)
+        self.keyBytes += sys.getsizeof(s)
+        self.Es[node] = ended
+        return node
+
+    def grow(self):
+        capacity = 2 * len(self.Ns)
+        for name in ['Qsa', 'Nsa', 'Ps', 'Vs', 'children', 'Ns', 'Es', 'expanded', 'visited']:
+            old = getattr(self, name)
+            new = np.zeros((capacity,) + old.shape[1:], dtype=old.dtype)
+            if name == 'children':
+                new.fill(-1)
+            new[:len(old)] = old
+            setattr(self, name, new)
+
+    def subtree(self, root, evicted=None, capacity=None):
+        """
+        Returns a new NodeTable holding only the nodes reachable from root,
+        renumbered so that root gets node id 0. The nodes marked in the
+        boolean array evicted are cut off, together with the nodes that are
+        only reachable through them. The new table has room for capacity
+        nodes, twice the kept ones (at least 64) by default.
+        """
+        seen = np.zeros(self.size, dtype=np.bool_)
+        if evicted is not None:
+            seen |= evicted
+        seen[root] = True
+        frontier = np.array([root])
+        keep = [frontier]
+        while frontier.size:
+            children = self.children[frontier].ravel()
+            children = np.unique(children[children >= 0])
+            frontier = children[~seen[children]]
+            seen[frontier] = True
+            keep.append(frontier)
+        keep = np.concatenate(keep)
+
+        newIds = np.full(self.size, -1, dtype=np.int32)
+        newIds[keep] = np.arange(len(keep), dtype=np.int32)
+
+        capacity = max(64, 2 * len(keep)) if capacity is None else max(capacity, len(keep))
+        table = NodeTable(self.actionSize, capacity=capacity)
+        table.size = len(keep)
+        table.keys = [self.keys[node] for node in keep]
+        table.ids = {s: node for node, s in enumerate(table.keys)}
+        table.keyBytes = sum(sys.getsizeof(s) for s in table.keys)
+        for name in ['Qsa', 'Nsa', 'Ps', 'Vs', 'Ns', 'Es', 'expanded', 'visited']:
+            getattr(table, name)[:len(keep)] = getattr(self, name)[keep]
+        children = self.children[keep]
+        table.children[:len(keep)] = np.where(children >= 0, newIds[children], -1)
+        return table
+
+    def nbytes(self):
+        """
+        Returns the number of bytes taken by the statistics arrays and the
+        keys.
+        """
+        return self.keyBytes + sum(getattr(self, name).nbytes
+                                   for name in ['Qsa', 'Nsa', 'Ps', 'Vs', 'children', 'Ns', 'Es', 'expanded', 'visited'])
+
+
 class MCTS():
     """
     This class handles the MCTS tree.
@@ -17,46 +144,433 @@ class MCTS():
         self.game = game
         self.nnet = nnet
         self.args = args
-        self.Qsa = {}  # stores Q values for s,a (as defined in the paper)
-        self.Nsa = {}  # stores #times edge s,a was visited
-        self.Ns = {}  # stores #times board s was visited
-        self.Ps = {}  # stores initial policy (returned by neural net)
+        self.nodes = NodeTable(self.game.getActionSize())
+        self.lastRoot = None  # node id of the board of the last getActionProb call
+        self.root = None  # node id of the root kept by advance
+        self.rootBoard = None  # board of the last getActionProb call, moved along by advance
+        self.symmetries = args.get('symmetries', False)
+        # use the game's getHashKey instead of stringRepresentation to identify boards
+        getHashKey = getattr(game, 'getHashKey', None)
+        self.hashKeys = getHashKey is not None and getHashKey(game.getInitBoard()) is not None
+        self.lastNumSims = 0  # number of simulations run by the last getActionProb call
+        self.selectedAction = None  # action chosen by the last gumbelSearch
+        self.createdNodes = 0  # number of nodes created so far, evicted ones included
+        self.evictedNodes = 0  # number of nodes freed by evict so far
+        self.clock = 0  # number of descents so far, stamps NodeTable.visited
+        self.startBudget()
+
+        # stack of the (node, action) edges traversed by the current simulation
+        self.pathNodes = [0] * 64
+        self.pathActions = [0] * 64
 
-        self.Es = {}  # stores game.getGameEnded ended for board s
-        self.Vs = {}  # stores game.getValidMoves for board s
+        self.VLsa = {}  # stores #pending (virtual loss) visits of each edge of board s in a batch
+        self.VLs = {}  # stores #pending (virtual loss) visits of board s in a batch
 
     def getActionProb(self, canonicalBoard, temp=1):
         """
         This function performs numMCTSSims simulations of MCTS starting from
-        canonicalBoard.
+        canonicalBoard. If args.mctsBatchSize is larger than 1, the simulations
+        are run in batches whose leaves are evaluated together (see
+        searchBatch).
+
+        If canonicalBoard is the root kept by advance, the visits it already
+        has count towards numMCTSSims.
+
+        The search stops early once args.maxTimeMs milliseconds have passed or
+        args.maxNodes new nodes were created, if these are set. With temp=0
+        and args.earlyStopping set, it also stops as soon as the most visited
+        action can no longer be overtaken by the remaining simulations. The
+        number of simulations that were run is kept in lastNumSims. If no
+        action was visited before the budget ran out, the network's prior is
+        used instead of the visit counts.
+
+        With args.symmetries set, the symmetric forms of a board (see
+        game.getSymmetries) share one node, so their statistics and network
+        evaluations are shared too (see symmetricForm).
+
+        With args.maxTreeNodes or args.maxTreeBytes set, the least recently
+        visited nodes are evicted whenever the tree outgrows them (see evict).
+
+        With args.gumbel set, the root actions are chosen by Gumbel sequential
+        halving instead (see gumbelSearch). Then temp=0 returns the chosen
+        action, and any other temp the improved policy, with the chosen action
+        kept in selectedAction.
 
         Returns:
             probs: a policy vector where the probability of the ith action is
                    proportional to Nsa[(s,a)]**(1./temp)
         """
-        for i in range(self.args.numMCTSSims):
-            self.search(canonicalBoard)
+        canonicalBoard, perm, s, root, numSims = self.startSearch(canonicalBoard)
 
-        s = self.game.stringRepresentation(canonicalBoard)
-        counts = [self.Nsa[(s, a)] if (s, a) in self.Nsa else 0 for a in range(self.game.getActionSize())]
+        if self.args.get('gumbel', False):
+            self.startBudget()
+            probs, action = self.gumbelSearch(canonicalBoard, root, self.args.numMCTSSims, gumbelNoise=temp != 0)
+            self.lastRoot = self.nodes.ids[s]  # evict renumbers the nodes
+            self.selectedAction = action if perm is None else int(perm[action])
+            if temp == 0:
+                probs = [0] * len(probs)
+                probs[action] = 1
+            return self.fromSymmetricForm(probs, perm)
 
-        if temp == 0:
-            bestAs = np.array(np.argwhere(counts == np.max(counts))).flatten()
-            bestA = np.random.choice(bestAs)
-            probs = [0] * len(counts)
-            probs[bestA] = 1
-            return probs
+        self.startBudget(earlyStopping=temp == 0 and self.args.get('earlyStopping', False))
+        self.lastNumSims = self.runSimulations(canonicalBoard, root, numSims)
+        return self.finishSearch(canonicalBoard, perm, s, temp)
 
-        counts = [x ** (1. / temp) for x in counts]
-        counts_sum = float(sum(counts))
-        probs = [x / counts_sum for x in counts]
-        return probs
+    def getActionProbSteps(self, canonicalBoard, temp=1):
+        """
+        A generator version of getActionProb for lockstep self-play, where
+        the leaves of several searches are evaluated together. It yields the
+        leaf board of every simulation that needs the neural network, expects
+        its (pi, v) to be sent back, and returns the probs of getActionProb.
+        args.gumbel and args.mctsBatchSize are not supported.
+        """
+        canonicalBoard, perm, s, root, numSims = self.startSearch(canonicalBoard)
+        self.startBudget(earlyStopping=temp == 0 and self.args.get('earlyStopping', False))
+        sims = 0
+        while sims < numSims and not self.outOfBudget(root, sims, numSims):
+            depth, node, board = self.descend(canonicalBoard, root)
+            if self.nodes.Es[node] != 0:
+                # terminal node
+                v = self.nodes.Es[node]
+            else:
+                # leaf node
+                pi, v = yield board
+                self.expand(node, board, pi)
+                v = np.asarray(v).item()
+            self.backup(self.pathNodes, self.pathActions, depth, v)
+            sims += 1
+            if self.overLimit():
+                root = self.evict(root)
+        self.lastNumSims = sims
+        return self.finishSearch(canonicalBoard, perm, s, temp)
+
+    def startSearch(self, canonicalBoard):
+        """
+        Prepares the root of a getActionProb search from canonicalBoard.
+
+        Returns:
+            canonicalBoard: the board to search (its symmetric form, if used)
+            perm: the action permutation of symmetricForm
+            s: the key of the root
+            root: the node id of the root
+            numSims: the number of simulations to run
+        """
+        self.rootBoard = canonicalBoard
+        canonicalBoard, perm = self.symmetricForm(canonicalBoard)
+        s = self.getKey(canonicalBoard)
+        root = self.getNode(canonicalBoard, s)
+        numSims = self.args.numMCTSSims
+        if root == self.root:
+            # the first simulation expands the root, the others add a visit
+            numSims -= int(self.nodes.expanded[root]) + int(self.nodes.Ns[root])
+        self.root = None
+        return canonicalBoard, perm, s, root, numSims
+
+    def finishSearch(self, canonicalBoard, perm, s, temp):
+        """
+        Returns the probs of a getActionProb search from canonicalBoard, whose
+        root has key s, from the visit counts of its actions.
+        """
+        log.debug(f'Ran {self.lastNumSims} simulations')
+        root = self.nodes.ids[s]  # evict renumbers the nodes
+        self.lastRoot = root
+
+        counts = self.nodes.Nsa[root]
+        if not counts.any():
+            # the budget ran out before any action was visited, fall back to the prior
+            if not self.nodes.expanded[root]:
+                self.search(canonicalBoard, root)
+            counts = self.nodes.Ps[root]
+        return self.fromSymmetricForm(probsFromCounts(counts.tolist(), temp), perm)
 
-    def search(self, canonicalBoard):
+    def gumbelSearch(self, canonicalBoard, root, numSims, gumbelNoise=True):
+        """
+        Runs numSims simulations from canonicalBoard, whose node id is root,
+        with the root actions chosen by sequential halving as in Gumbel
+        AlphaZero (Danihelka et al., 2022), and PUCT below the root.
+
+        The args.gumbelMaxActions (16) actions with the highest prior logits
+        plus Gumbel noise (if gumbelNoise) are considered. The simulations are
+        spread evenly over them in rounds, and after every round the worse
+        half is dropped, scored by noise + logits + sigma(Q), until two
+        actions are left. sigma scales Q by (args.gumbelCVisit (50) + the
+        largest visit count) * args.gumbelCScale (1).
+
+        Returns:
+            probs: the improved policy softmax(logits + sigma(completed Q)),
+                   where unvisited actions get a mix of the root value and
+                   the Q of the visited actions
+            action: the considered action with the best final score
+        """
+        sims = 0
+        if not self.nodes.expanded[root]:
+            v = -self.search(canonicalBoard, root)
+            sims = 1
+        else:
+            v = np.asarray(self.nnet.predict(canonicalBoard)[1]).item()
+        nodes = self.nodes
+
+        valids = nodes.Vs[root]
+        with np.errstate(divide='ignore'):
+            logits = np.where(valids, np.log(nodes.Ps[root].astype(np.float64)), -np.inf)
+        noise = np.random.gumbel(size=len(logits)) if gumbelNoise else np.zeros(len(logits))
+
+        numActions = min(self.args.get('gumbelMaxActions', 16), int(np.sum(valids)))
+        considered = np.argsort(-(noise + logits), kind='stable')[:numActions]
+        numPhases = max(1, math.ceil(math.log2(numActions)))
+
+        while sims < numSims and not self.outOfBudget(root, sims, numSims):
+            visits = max(1, numSims // (numPhases * len(considered)))
+            for _ in range(visits):
+                for a in considered:
+                    if sims >= numSims or self.outOfBudget(root, sims, numSims):
+                        break
+                    self.search(canonicalBoard, root, action=a)
+                    sims += 1
+                    if self.overLimit():
+                        root = self.evict(root)
+            if len(considered) > 2:
+                scores = noise + logits + self.sigma(root, self.completedQ(root, v))
+                considered = considered[np.argsort(-scores[considered], kind='stable')[:math.ceil(len(considered) / 2)]]
+        self.lastNumSims = sims
+
+        sigmaQ = self.sigma(root, self.completedQ(root, v))
+        scores = noise + logits + sigmaQ
+        action = int(considered[np.argmax(scores[considered])])
+
+        improved = np.exp(logits + sigmaQ - np.max(logits + sigmaQ))
+        return (improved / np.sum(improved)).tolist(), action
+
+    def completedQ(self, root, v):
+        """
+        Returns the Q values of the root actions, rescaled to [0, 1] over the
+        valid actions. Unvisited actions get the mix of the root value v and
+        the prior weighted Q of the visited actions.
+        """
+        nodes = self.nodes
+        Nsa, Ps, valids = nodes.Nsa[root], nodes.Ps[root].astype(np.float64), nodes.Vs[root]
+        Qsa = nodes.Qsa[root].astype(np.float64)
+        visited = Nsa > 0
+        total = np.sum(Nsa)
+        if visited.any():
+            weighted = np.sum(Ps[visited] * Qsa[visited]) / max(np.sum(Ps[visited]), EPS)
+            v = (v + total * weighted) / (1 + total)
+        q = np.where(visited, Qsa, v)
+        lo, hi = np.min(q[valids]), np.max(q[valids])
+        return np.where(valids, (q - lo) / max(hi - lo, EPS), 0)
+
+    def sigma(self, root, q):
+        """
+        Returns the monotone transformation of the Q values q of the root
+        actions used by gumbelSearch.
+        """
+        cVisit = self.args.get('gumbelCVisit', 50)
+        cScale = self.args.get('gumbelCScale', 1.0)
+        return (cVisit + np.max(self.nodes.Nsa[root])) * cScale * q
+
+    def symmetricForm(self, canonicalBoard):
+        """
+        Returns the symmetric form of canonicalBoard with the smallest
+        stringRepresentation, which stands for all its symmetric forms in the
+        tree, and perm, the actions of canonicalBoard in the order of that
+        form's actions (its policy is pi[perm]). Without args.symmetries the
+        board is returned as is, with perm None.
+        """
+        if not self.symmetries:
+            return canonicalBoard, None
+        forms = self.game.getSymmetries(canonicalBoard, np.arange(self.game.getActionSize()))
+        board, perm = min(forms, key=lambda form: self.game.stringRepresentation(form[0]))
+        return board, np.asarray(perm)
+
+    def fromSymmetricForm(self, pi, perm):
+        """
+        Maps the policy pi of a symmetric form back to the actions of the board
+        it was made from, given the perm returned by symmetricForm.
+        """
+        if perm is None:
+            return pi
+        boardPi = np.zeros_like(np.asarray(pi))
+        boardPi[perm] = pi
+        return boardPi.tolist() if isinstance(pi, list) else boardPi
+
+    def runSimulations(self, canonicalBoard, root, numSims):
+        """
+        Performs up to numSims simulations from canonicalBoard, whose node id
+        is root, one at a time or in batches of args.mctsBatchSize, stopping
+        early when the budget set by startBudget is used up.
+
+        Returns:
+            sims: the number of simulations that were run
+        """
+        batchSize = self.args.get('mctsBatchSize', 1)
+        sims = 0
+        while sims < numSims and not self.outOfBudget(root, sims, numSims):
+            if batchSize > 1:
+                sims += self.searchBatch(canonicalBoard, min(batchSize, numSims - sims))
+            else:
+                self.search(canonicalBoard, root)
+                sims += 1
+            if self.overLimit():
+                root = self.evict(root)
+        return sims
+
+    def startBudget(self, earlyStopping=False):
+        """
+        Starts the time (args.maxTimeMs) and node (args.maxNodes) budgets of a
+        search. If earlyStopping is set, the search also stops once the most
+        visited root action is decided.
+        """
+        maxTimeMs = self.args.get('maxTimeMs')
+        maxNodes = self.args.get('maxNodes')
+        self.deadline = None if maxTimeMs is None else time.time() + maxTimeMs / 1000.
+        self.nodeLimit = None if maxNodes is None else self.createdNodes + maxNodes
+        self.earlyStopping = earlyStopping
+
+    def outOfBudget(self, root, sims, numSims):
+        """
+        Returns True if the search from root should stop after sims of its
+        numSims simulations.
+        """
+        if self.deadline is not None and time.time() >= self.deadline:
+            return True
+        if self.nodeLimit is not None and self.createdNodes >= self.nodeLimit:
+            return True
+        if self.earlyStopping and self.nodes.actionSize > 1:
+            second, best = np.partition(self.nodes.Nsa[root], -2)[-2:]
+            if best - second > numSims - sims:
+                return True
+        return False
+
+    def treeLimit(self):
+        """
+        Returns the number of nodes the tree may hold under args.maxTreeNodes
+        and args.maxTreeBytes, or None if neither is set.
+        """
+        limits = []
+        if self.args.get('maxTreeNodes') is not None:
+            limits.append(self.args.maxTreeNodes)
+        if self.args.get('maxTreeBytes') is not None:
+            nodes = self.nodes
+            nodeBytes = (nodes.nbytes() - nodes.keyBytes) / len(nodes.Ns) + nodes.keyBytes / max(len(nodes), 1)
+            limits.append(int(self.args.maxTreeBytes // nodeBytes))
+        return min(limits) if limits else None
+
+    def overLimit(self):
+        """
+        Returns True if the tree holds more nodes or bytes than allowed by
+        args.maxTreeNodes and args.maxTreeBytes.
+        """
+        limit = self.treeLimit()
+        if limit is None:
+            return False
+        maxTreeBytes = self.args.get('maxTreeBytes')
+        return len(self.nodes) > limit or (maxTreeBytes is not None and self.nodes.nbytes() > maxTreeBytes)
+
+    def evict(self, root):
+        """
+        Frees the least recently visited nodes of the tree, the least visited
+        first among equally recent ones, down to 3/4 of treeLimit, together
+        with the nodes that are only reachable through them. root is never
+        evicted. It is called between simulations (or batches), so the limits
+        may be passed during one. The statistics of the edges into evicted nodes are kept, and
+        an evicted board is expanded again if the search comes back to it.
+
+        The numbers of evicted nodes and bytes in use are kept in
+        evictedNodes and nodes.nbytes().
+
+        Returns:
+            root: the node id of root after the nodes were renumbered
         """
-        This function performs one iteration of MCTS. It is recursively called
-        till a leaf node is found. The action chosen at each node is one that
-        has the maximum upper confidence bound as in the paper.
+        nodes, limit = self.nodes, self.treeLimit()
+        size = len(nodes)
+        order = np.lexsort((nodes.Ns[:size], nodes.visited[:size]))
+        order = order[order != root]
+        evicted = np.zeros(size, dtype=np.bool_)
+        evicted[order[:max(size - 3 * limit // 4, 0)]] = True
+
+        self.nodes = nodes.subtree(root, evicted, capacity=limit)
+        self.evictedNodes += size - len(self.nodes)
+        log.debug(f'Evicted {size - len(self.nodes)} nodes, {self.nodes.nbytes()} bytes in use')
+        return 0
+
+    def advance(self, action):
+        """
+        Moves the root of the tree to the board reached by action from the
+        board of the last getActionProb call (or the last advance). The subtree
+        of that board is kept and renumbered, and the rest of the tree is freed.
+        If the board was never reached by the search, the tree is cleared.
+
+        Call it with every move played, by either player, to reuse the search
+        between moves. With args.symmetries set, the board is followed
+        along with the moves, so action is relative to the board given to
+        getActionProb rather than to its symmetric form.
+        """
+        root = self.root if self.root is not None else self.lastRoot
+        if self.symmetries:
+            # action is relative to the actual board, find the child by its symmetric form
+            child = -1
+            if self.rootBoard is not None:
+                next_s, next_player = self.game.getNextState(self.rootBoard, 1, action)
+                self.rootBoard = self.game.getCanonicalForm(next_s, next_player)
+                if root is not None:
+                    s = self.getKey(self.symmetricForm(self.rootBoard)[0])
+                    child = self.nodes.ids.get(s, -1)
+        else:
+            child = -1 if root is None else self.nodes.children[root, action]
+        if child < 0:
+            self.nodes = NodeTable(self.game.getActionSize())
+            self.root = None
+        else:
+            self.nodes = self.nodes.subtree(child)
+            self.root = 0
+        self.lastRoot = None
+
+    def getKey(self, canonicalBoard, parentBoard=None, parentKey=None, action=None):
+        """
+        Returns the key of canonicalBoard in the tree: game.getHashKey if the
+        game implements it, else game.stringRepresentation. Hash keys are
+        updated from the parent's key when parentBoard is given.
+        """
+        if self.hashKeys:
+            return self.game.getHashKey(canonicalBoard, parentBoard, parentKey, action)
+        return self.game.stringRepresentation(canonicalBoard)
+
+    def getNode(self, canonicalBoard, s=None):
+        """
+        Returns the node id of canonicalBoard, whose key is s if given,
+        creating the node if the board has not been seen before.
+        """
+        if s is None:
+            s = self.getKey(canonicalBoard)
+        node = self.nodes.ids.get(s)
+        if node is None:
+            node = self.nodes.add(s, self.game.getGameEnded(canonicalBoard, 1))
+            self.createdNodes += 1
+        return node
+
+    def getChild(self, node, a, nextBoard, board=None):
+        """
+        Returns the node id reached from node by action a, where nextBoard is
+        the resulting canonical board. Known children are found by index,
+        without hashing nextBoard. board is the canonical board of node, if
+        the key of nextBoard may be updated from it.
+        """
+        child = self.nodes.children[node, a]
+        if child < 0:
+            s = None
+            if board is not None:
+                s = self.getKey(nextBoard, board, self.nodes.keys[node], a)
+            child = self.getNode(nextBoard, s)
+            self.nodes.children[node, a] = child
+        return child
+
+    def search(self, canonicalBoard, node=None, action=None):
+        """
+        This function performs one iteration of MCTS. It descends the tree
+        from canonicalBoard, choosing at each node the action with the maximum
+        upper confidence bound as in the paper, until a leaf node is found. The
+        traversed edges are recorded in the path stack, so the search needs
+        no recursion and works for games of any length.
 
         Once a leaf node is found, the neural network is called to return an
         initial policy P and a value v for the state. This value is propagated
@@ -68,69 +582,340 @@ class MCTS():
         state. This is done since v is in [-1,1] and if v is the value of a
         state for the current player, then its value is -v for the other player.
 
+        If action is given, it is played from canonicalBoard instead of the
+        action with the maximum upper confidence bound.
+
         Returns:
             v: the negative of the value of the current canonicalBoard
         """
+        if node is None:
+            node = self.getNode(canonicalBoard)
 
-        s = self.game.stringRepresentation(canonicalBoard)
+        depth, node, board = self.descend(canonicalBoard, node, action=action)
 
-        if s not in self.Es:
-            self.Es[s] = self.game.getGameEnded(canonicalBoard, 1)
-        if self.Es[s] != 0:
+        if self.nodes.Es[node] != 0:
             # terminal node
-            return -self.Es[s]
-
-        if s not in self.Ps:
+            v = self.nodes.Es[node]
+        else:
             # leaf node
-            self.Ps[s], v = self.nnet.predict(canonicalBoard)
-            valids = self.game.getValidMoves(canonicalBoard, 1)
-            self.Ps[s] = self.Ps[s] * valids  # masking invalid moves
-            sum_Ps_s = np.sum(self.Ps[s])
-            if sum_Ps_s > 0:
-                self.Ps[s] /= sum_Ps_s  # renormalize
+            pi, v = self.nnet.predict(board)
+            self.expand(node, board, pi)
+            v = np.asarray(v).item()
+
+        return self.backup(self.pathNodes, self.pathActions, depth, v)
+
+    def searchBatch(self, canonicalBoard, batchSize):
+        """
+        This function performs up to batchSize iterations of MCTS whose leaves
+        are sent to the neural network in a single nnet.predict_batch call.
+
+        Every descent adds a virtual loss to the edges it traverses, so the
+        following descents of the same batch are steered towards different
+        leaves. Terminal leaves are backed up right away. A descent that ends
+        on a leaf already waiting for evaluation keeps its virtual loss until
+        the batch is evaluated and the batch goes on filling, until batchSize
+        such collisions have happened.
+
+        Returns:
+            sims: the number of simulations that were completed
+        """
+        sims = 0
+        pending = []  # (pathNodes, pathActions, node, board) of the leaves waiting for the network
+        pendingNodes = set()
+        collisions = []  # (pathNodes, pathActions) of the descents that ended on a pending leaf
+        root = self.getNode(canonicalBoard)
+
+        while sims + len(pending) < batchSize and len(collisions) < batchSize:
+            depth, node, board = self.descend(canonicalBoard, root, virtualLoss=True)
+            pathNodes, pathActions = self.pathNodes[:depth], self.pathActions[:depth]
+            if self.nodes.Es[node] != 0:
+                # terminal node
+                self.backup(pathNodes, pathActions, depth, self.nodes.Es[node], virtualLoss=True)
+                sims += 1
+            elif node in pendingNodes:
+                collisions.append((pathNodes, pathActions))
+                if depth == 0:
+                    # the root itself is pending, no other leaf can be reached
+                    break
             else:
-                # if all valid moves were masked make all valid moves equally probable
+                pending.append((pathNodes, pathActions, node, board))
+                pendingNodes.add(node)
 
-                # NB! All valid moves may be masked if either your NNet architecture is insufficient or you've get overfitting or something else.
-                # If you have got dozens or hundreds of these messages you should pay attention to your NNet and/or training process.   
-                log.error("All valid moves were masked, doing a workaround.")
-                self.Ps[s] = self.Ps[s] + valids
-                self.Ps[s] /= np.sum(self.Ps[s])
+        if pending:
+            pis, vs = self.nnet.predict_batch([board for _, _, _, board in pending])
+            for (pathNodes, pathActions, node, board), pi, v in zip(pending, pis, vs):
+                self.expand(node, board, pi)
+                self.backup(pathNodes, pathActions, len(pathNodes), np.asarray(v).item(), virtualLoss=True)
+            sims += len(pending)
 
-            self.Vs[s] = valids
-            self.Ns[s] = 0
-            return -v
+        for pathNodes, pathActions in collisions:
+            for node, a in zip(pathNodes, pathActions):
+                self.removeVirtualLoss(node, a)
 
-        valids = self.Vs[s]
-        cur_best = -float('inf')
-        best_act = -1
+        return sims
 
-        # pick the action with the highest upper confidence bound
-        for a in range(self.game.getActionSize()):
-            if valids[a]:
-                if (s, a) in self.Qsa:
-                    u = self.Qsa[(s, a)] + self.args.cpuct * self.Ps[s][a] * math.sqrt(self.Ns[s]) / (
-                            1 + self.Nsa[(s, a)])
-                else:
-                    u = self.args.cpuct * self.Ps[s][a] * math.sqrt(self.Ns[s] + EPS)  # Q = 0 ?
+    def descend(self, canonicalBoard, node, virtualLoss=False, action=None):
+        """
+        Descends from canonicalBoard, whose node id is node, until a terminal
+        or unexpanded board is found. The traversed edges are written to
+        pathNodes and pathActions, and get a virtual loss if virtualLoss is
+        set. If action is given, it is taken first instead of the best action.
 
-                if u > cur_best:
-                    cur_best = u
-                    best_act = a
+        Returns:
+            depth: the number of traversed edges
+            node: the node id of the leaf board
+            board: the canonical leaf board
+        """
+        nodes = self.nodes
+        depth = 0
+        board = canonicalBoard
+        self.clock += 1
+        while nodes.Es[node] == 0 and nodes.expanded[node]:
+            nodes.visited[node] = self.clock
+            a = self.pickAction(node) if action is None else action
+            action = None
+            if virtualLoss:
+                self.addVirtualLoss(node, a)
+            if depth == len(self.pathNodes):
+                self.pathNodes.extend([0] * depth)
+                self.pathActions.extend([0] * depth)
+            self.pathNodes[depth] = node
+            self.pathActions[depth] = a
+            depth += 1
 
-        a = best_act
-        next_s, next_player = self.game.getNextState(canonicalBoard, 1, a)
-        next_s = self.game.getCanonicalForm(next_s, next_player)
+            parent = board
+            next_s, next_player = self.game.getNextState(board, 1, a)
+            board = self.game.getCanonicalForm(next_s, next_player)
+            if self.symmetries:
+                # the symmetric form is not a move away from the parent board
+                board, parent = self.symmetricForm(board)[0], None
+            node = self.getChild(node, a, board, parent)
+            nodes = self.nodes  # getChild may have grown the arrays
+        nodes.visited[node] = self.clock
+        return depth, node, board
 
-        v = self.search(next_s)
+    def backup(self, pathNodes, pathActions, depth, v, virtualLoss=False):
+        """
+        Propagates the value v of the leaf reached by the first depth edges of
+        the path (from the point of view of the player to move at the leaf) up
+        the path, removing the virtual losses added by descend if virtualLoss
+        is set.
 
-        if (s, a) in self.Qsa:
-            self.Qsa[(s, a)] = (self.Nsa[(s, a)] * self.Qsa[(s, a)] + v) / (self.Nsa[(s, a)] + 1)
-            self.Nsa[(s, a)] += 1
+        Returns:
+            v: the negative of the value of the board at the start of the path
+        """
+        Qsa, Nsa, Ns = self.nodes.Qsa, self.nodes.Nsa, self.nodes.Ns
+        for i in range(depth - 1, -1, -1):
+            node, a = pathNodes[i], pathActions[i]
+            v = -v
+            if virtualLoss:
+                self.removeVirtualLoss(node, a)
+            n = Nsa[node, a]
+            Qsa[node, a] = (n * Qsa[node, a] + v) / (n + 1)
+            Nsa[node, a] = n + 1
+            Ns[node] += 1
+        return -v
 
+    def expand(self, node, canonicalBoard, pi):
+        """
+        Stores the masked and renormalized policy pi returned by the neural
+        network for the leaf node.
+        """
+        valids = self.game.getValidMoves(canonicalBoard, 1)
+        Ps = pi * valids  # masking invalid moves
+        sum_Ps_s = np.sum(Ps)
+        if sum_Ps_s > 0:
+            Ps /= sum_Ps_s  # renormalize
         else:
-            self.Qsa[(s, a)] = v
-            self.Nsa[(s, a)] = 1
+            # if all valid moves were masked make all valid moves equally probable
 
-        self.Ns[s] += 1
-        return -v
+            # NB! All valid moves may be masked if either your NNet architecture is insufficient or you've get overfitting or something else.
+            # If you have got dozens or hundreds of these messages you should pay attention to your NNet and/or training process.
+            log.error("All valid moves were masked, doing a workaround.")
+            Ps = Ps + valids
+            Ps /= np.sum(Ps)
+
+        self.nodes.Ps[node] = Ps
+        self.nodes.Vs[node] = valids
+        self.nodes.Ns[node] = 0
+        self.nodes.expanded[node] = True
+
+    def addDirichletNoise(self, node, alpha, epsilon):
+        """
+        Mixes Dirichlet(alpha) noise with weight epsilon into the prior of the
+        valid moves of the expanded node, as done at the root in the paper.
+        """
+        valids = self.nodes.Vs[node]
+        noise = np.random.dirichlet([alpha] * int(np.sum(valids)))
+        self.nodes.Ps[node, valids] = (1 - epsilon) * self.nodes.Ps[node, valids] + epsilon * noise
+
+    def pickAction(self, node):
+        """
+        Returns the valid action of the expanded node with the highest upper
+        confidence bound, computed for all actions at once. Ties go to the
+        lowest action. Pending visits of searchBatch count as losses.
+        """
+        Ps = self.nodes.Ps[node].astype(np.float64)
+        Qsa = self.nodes.Qsa[node].astype(np.float64)
+        Nsa = self.nodes.Nsa[node]
+        ns = self.nodes.Ns[node] + self.VLs.get(node, 0)
+
+        vl = self.VLsa.get(node)
+        if vl is not None:
+            Qsa = np.where(vl > 0, (Nsa * Qsa - vl) / np.maximum(Nsa + vl, 1), Qsa)
+            Nsa = Nsa + vl
+
+        # upper confidence bound of every action, with Q = 0 for unvisited edges
+        u = np.where(Nsa > 0,
+                     Qsa + self.args.cpuct * Ps * math.sqrt(ns) / (1 + Nsa),
+                     self.args.cpuct * Ps * math.sqrt(ns + EPS))
+        u[~self.nodes.Vs[node]] = -np.inf
+
+        return int(np.argmax(u))
+
+    def addVirtualLoss(self, node, a):
+        if node not in self.VLsa:
+            self.VLsa[node] = np.zeros(self.nodes.actionSize, dtype=np.int32)
+            self.VLs[node] = 0
+        self.VLsa[node][a] += 1
+        self.VLs[node] += 1
+
+    def removeVirtualLoss(self, node, a):
+        self.VLsa[node][a] -= 1
+        self.VLs[node] -= 1
+        if self.VLs[node] == 0:
+            del self.VLsa[node]
+            del self.VLs[node]
+
+
+class MCTSPlayer():
+    """
+    An Arena player that plays the most visited action of MCTS and keeps the
+    subtree of the position it reaches between moves. Its tree is cleared at
+    the start of every game.
+    """
+
+    def __init__(self, game, nnet, args):
+        self.game = game
+        self.nnet = nnet
+        self.args = args
+        self.mcts = MCTS(game, nnet, args)
+
+    def __call__(self, canonicalBoard):
+        action = np.argmax(self.mcts.getActionProb(canonicalBoard, temp=0))
+        self.mcts.advance(action)
+        return action
+
+    def steps(self, canonicalBoard):
+        """
+        A generator version of __call__ for Arena.playGamesBatched: yields the
+        leaf boards of the search, expects their (pi, v) to be sent back, and
+        returns the action. The limits of MCTS.getActionProbSteps apply.
+        """
+        action = np.argmax((yield from self.mcts.getActionProbSteps(canonicalBoard, temp=0)))
+        self.mcts.advance(action)
+        return action
+
+    def clone(self):
+        """
+        Returns a player of the same kind with an empty tree, that shares the
+        network and arguments of this one.
+        """
+        return self.__class__(self.game, self.nnet, self.args)
+
+    def startGame(self):
+        self.mcts = MCTS(self.game, self.nnet, self.args)
+
+    def notify(self, board, action):
+        self.mcts.advance(action)
+
+    def endGame(self):
+        self.mcts = MCTS(self.game, self.nnet, self.args)
+
+
+class PonderingMCTSPlayer(MCTSPlayer):
+    """
+    An MCTSPlayer that keeps searching in a background thread while the
+    opponent thinks (pondering). After each of its moves it searches the
+    opponent's position, and on notify it stops and moves the root to the
+    opponent's actual move, so the visits of that reply count towards its next
+    search. The pondering stops after args.maxPonderSims (10 * numMCTSSims)
+    simulations. It shares the process with the opponent, so use it against
+    humans or engines that run elsewhere.
+    """
+
+    def __init__(self, game, nnet, args):
+        super().__init__(game, nnet, args)
+        self.thread = None
+        self.stopPondering = threading.Event()
+        self.ponderedSims = 0  # number of simulations of the last pondering
+
+    def __call__(self, canonicalBoard):
+        # without a notify since the last move, the pondering is still running
+        self.stop()
+        action = super().__call__(canonicalBoard)
+        next_s, next_player = self.game.getNextState(canonicalBoard, 1, action)
+        board, _ = self.mcts.symmetricForm(self.game.getCanonicalForm(next_s, next_player))
+        if self.game.getGameEnded(board, 1) == 0:
+            root = self.mcts.getNode(board)
+            self.mcts.root = root
+            self.stopPondering.clear()
+            self.thread = threading.Thread(target=self.ponder, args=(board, root), daemon=True)
+            self.thread.start()
+        return action
+
+    def ponder(self, board, root):
+        """
+        Searches board, whose node id is root, until stop is called.
+        """
+        self.ponderedSims = 0
+        maxSims = self.args.get('maxPonderSims', 10 * self.args.numMCTSSims)
+        while self.ponderedSims < maxSims and not self.stopPondering.is_set():
+            self.mcts.search(board, root)
+            self.ponderedSims += 1
+            if self.mcts.overLimit():
+                root = self.mcts.evict(root)
+                self.mcts.root = root
+
+    def stop(self):
+        if self.thread is not None:
+            self.stopPondering.set()
+            self.thread.join()
+            self.thread = None
+
+    def startGame(self):
+        self.stop()
+        super().startGame()
+
+    def notify(self, board, action):
+        self.stop()
+        super().notify(board, action)
+
+    def endGame(self):
+        self.stop()
+        super().endGame()
+
+
+class MCTSPlayerFactory():
+    """
+    A picklable recipe for an MCTSPlayer whose network of class nnetClass is
+    loaded from folder/filename (an untrained one if filename is None), for
+    building the players inside worker processes, e.g. of Arena.playGames.
+    Calling it builds the player.
+    """
+
+    def __init__(self, game, nnetClass, folder, filename, args):
+        self.game = game
+        self.nnetClass = nnetClass
+        self.folder = folder
+        self.filename = filename
+        self.args = args
+
+    def __call__(self):
+        nnet = self.nnetClass(self.game)
+        if self.filename is not None:
+            nnet.load_checkpoint(self.folder, self.filename)
+        if self.args.get('evalCacheSize', 0) > 0:
+            from CachedNNet import CachedNNet
+            nnet = CachedNNet(self.game, nnet, self.args.evalCacheSize)
+        return MCTSPlayer(self.game, nnet, self.args)
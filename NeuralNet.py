@@ -8,6 +8,10 @@ class NeuralNet():
     See othello/NNet.py for an example implementation.
     """
 
+    # set by networks whose train weights the losses by examples.weights,
+    # which Coach needs for args.dedupExamples (see DedupExamples)
+    weightedTraining = False
+
     def __init__(self, game):
         pass
 
@@ -36,6 +40,26 @@ class NeuralNet():
         """
         pass
 
+    def predict_batch(self, boards):
+        """
+        Input:
+            boards: a list of boards in their canonical form.
+
+        Returns:
+            pis: the policy vector of every board, as returned by predict
+            vs: the value of every board, as returned by predict
+
+        Used by MCTS to evaluate several leaves at once. The default calls
+        predict on every board; override it to run a single batched forward
+        pass instead.
+        """
+        pis, vs = [], []
+        for board in boards:
+            pi, v = self.predict(board)
+            pis.append(pi)
+            vs.append(v)
+        return pis, vs
+
     def save_checkpoint(self, folder, filename):
         """
         Saves the current neural network (with its parameters) in
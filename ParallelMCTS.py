@@ -0,0 +1,240 @@
+import logging
+import multiprocessing
+import queue
+import threading
+
+import numpy as np
+
+from MCTS import MCTS, probsFromCounts
+
+log = logging.getLogger(__name__)
+
+
+class InferenceQueue():
+    """
+    This class collects the leaf boards of the ParallelMCTS workers and
+    evaluates them with nnet.predict_batch, up to maxBatchSize boards at a time.
+    A batch is sent as soon as it is full, or when no new board arrived for
+    timeout seconds.
+    """
+
+    def __init__(self, nnet, maxBatchSize, timeout=0.001):
+        self.nnet = nnet
+        self.maxBatchSize = maxBatchSize
+        self.timeout = timeout
+        self.requests = queue.Queue()
+
+    def predict(self, board):
+        """
+        Called by the workers. Blocks until board was evaluated.
+
+        Returns:
+            pi, v: as returned by nnet.predict
+        """
+        request = {'board': board, 'done': threading.Event()}
+        self.requests.put(request)
+        request['done'].wait()
+        if 'error' in request:
+            raise request['error']
+        return request['pi'], request['v']
+
+    def stop(self):
+        self.requests.put(None)
+
+    def run(self):
+        """
+        Evaluates batches of requests until stop is called.
+        """
+        while True:
+            request = self.requests.get()
+            if request is None:
+                return
+            batch = [request]
+            while len(batch) < self.maxBatchSize:
+                try:
+                    request = self.requests.get(timeout=self.timeout)
+                except queue.Empty:
+                    break
+                if request is None:
+                    self.requests.put(None)
+                    break
+                batch.append(request)
+
+            try:
+                pis, vs = self.nnet.predict_batch([request['board'] for request in batch])
+                for request, pi, v in zip(batch, pis, vs):
+                    request['pi'], request['v'] = pi, v
+            except Exception as e:
+                for request in batch:
+                    request['error'] = e
+            for request in batch:
+                request['done'].set()
+
+
+class ParallelMCTS(MCTS):
+    """
+    This class runs the simulations of MCTS in args.numMCTSThreads worker
+    threads that share one tree (tree parallelism). Each worker adds a virtual
+    loss to the edges it traverses, so concurrent workers spread over different
+    leaves, and the workers' leaves are evaluated together through a single
+    InferenceQueue. The tree is only touched while holding a lock; the neural
+    network runs outside of it, so frameworks that release the GIL during a
+    forward pass (e.g. PyTorch) keep several cores busy.
+    """
+
+    def __init__(self, game, nnet, args):
+        super().__init__(game, nnet, args)
+        self.lock = threading.Lock()
+
+    def runSimulations(self, canonicalBoard, root, numSims):
+        if numSims <= 0 or self.outOfBudget(root, 0, numSims):
+            return 0
+        if self.overLimit():
+            # the workers hold node ids, so the tree is only trimmed between searches
+            root = self.evict(root)
+        expanded = 0
+        if not self.nodes.expanded[root]:
+            # expand the root before the workers start, so they have edges to spread over
+            self.search(canonicalBoard, root)
+            expanded = 1
+
+        numThreads = self.args.get('numMCTSThreads', 4)
+        self.started = 0  # number of simulations taken by the workers
+        self.pending = {}  # node id -> threading.Event of the leaves being evaluated
+        self.errors = []
+        self.inference = InferenceQueue(self.nnet, numThreads)
+
+        evaluator = threading.Thread(target=self.inference.run, daemon=True)
+        evaluator.start()
+        workers = [threading.Thread(target=self.worker, args=(canonicalBoard, root, numSims - expanded), daemon=True)
+                   for _ in range(numThreads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        self.inference.stop()
+        evaluator.join()
+
+        if self.errors:
+            raise self.errors[0]
+        return expanded + self.started
+
+    def worker(self, canonicalBoard, root, numSims):
+        """
+        Runs simulations from canonicalBoard until numSims have been started
+        by all the workers together, or the search budget is used up.
+        """
+        try:
+            while True:
+                with self.lock:
+                    if self.started >= numSims or self.errors or self.outOfBudget(root, self.started, numSims):
+                        return
+                    depth, node, board = self.descend(canonicalBoard, root, virtualLoss=True)
+                    pathNodes, pathActions = self.pathNodes[:depth], self.pathActions[:depth]
+
+                    if self.nodes.Es[node] != 0:
+                        # terminal node
+                        self.backup(pathNodes, pathActions, depth, self.nodes.Es[node], virtualLoss=True)
+                        self.started += 1
+                        continue
+
+                    evaluated = self.pending.get(node)
+                    if evaluated is None:
+                        self.pending[node] = threading.Event()
+                        self.started += 1
+                    else:
+                        # another worker is evaluating this leaf, retry once it is expanded
+                        for pnode, pa in zip(pathNodes, pathActions):
+                            self.removeVirtualLoss(pnode, pa)
+
+                if evaluated is not None:
+                    evaluated.wait()
+                    continue
+
+                pi, v = self.inference.predict(board)
+
+                with self.lock:
+                    self.expand(node, board, pi)
+                    self.backup(pathNodes, pathActions, depth, np.asarray(v).item(), virtualLoss=True)
+                    self.pending.pop(node).set()
+        except Exception as e:
+            log.exception('MCTS worker failed')
+            with self.lock:
+                self.errors.append(e)
+                for evaluated in self.pending.values():
+                    evaluated.set()
+
+
+# the game, network and search arguments of a RootParallelMCTS worker process
+rootWorker = {}
+
+
+def initRootWorker(game, nnetClass, folder, filename, args):
+    """
+    Pool initializer of RootParallelMCTS: builds the network once per worker
+    process and loads its checkpoint.
+    """
+    nnet = nnetClass(game)
+    if filename is not None:
+        nnet.load_checkpoint(folder, filename)
+    rootWorker.update(game=game, nnet=nnet, args=args)
+
+
+def searchRoot(canonicalBoard, seed):
+    """
+    Runs an independent MCTS with numMCTSSims simulations from canonicalBoard
+    in a RootParallelMCTS worker. Dirichlet noise seeded by seed is mixed into
+    the root prior, so that the workers explore differently.
+
+    Returns:
+        counts: the visit counts of the root edges
+    """
+    game, nnet, args = rootWorker['game'], rootWorker['nnet'], rootWorker['args']
+    np.random.seed(seed)
+    mcts = MCTS(game, nnet, args)
+    canonicalBoard, perm = mcts.symmetricForm(canonicalBoard)
+    root = mcts.getNode(canonicalBoard)
+    if mcts.nodes.Es[root] == 0 and args.numMCTSSims > 0:
+        mcts.search(canonicalBoard, root)
+        mcts.addDirichletNoise(root, args.get('dirichletAlpha', 0.3), args.get('dirichletEpsilon', 0.25))
+        mcts.runSimulations(canonicalBoard, root, args.numMCTSSims - 1)
+        root = mcts.getNode(canonicalBoard)  # evict renumbers the nodes
+    return mcts.fromSymmetricForm(mcts.nodes.Nsa[root].copy(), perm)
+
+
+class RootParallelMCTS():
+    """
+    This class runs args.numMCTSWorkers independent searches of the same root
+    in a process pool (root parallelism) and merges their root visit counts.
+    Each worker process loads the network from folder/filename once and keeps
+    it for all the following moves; call close when done.
+
+    It offers getActionProb like MCTS, e.g. for the temp=0 decisions of an
+    Arena player.
+    """
+
+    def __init__(self, game, nnetClass, folder, filename, args, seed=0):
+        self.game = game
+        self.args = args
+        self.numWorkers = args.get('numMCTSWorkers', multiprocessing.cpu_count())
+        self.seed = seed
+        self.pool = multiprocessing.Pool(self.numWorkers, initializer=initRootWorker,
+                                         initargs=(game, nnetClass, folder, filename, args))
+
+    def getActionProb(self, canonicalBoard, temp=1):
+        """
+        Runs numMCTSSims simulations from canonicalBoard in every worker.
+
+        Returns:
+            probs: a policy vector where the probability of the ith action is
+                   proportional to the summed visit counts of the workers
+                   raised to the power 1./temp
+        """
+        seeds = [self.seed + i for i in range(self.numWorkers)]
+        self.seed += self.numWorkers
+        counts = self.pool.starmap(searchRoot, [(canonicalBoard, seed) for seed in seeds])
+        return probsFromCounts(np.sum(counts, axis=0).tolist(), temp)
+
+    def close(self):
+        self.pool.close()
+        self.pool.join()
@@ -0,0 +1,88 @@
+import queue
+import threading
+
+import numpy as np
+import torch
+
+
+class PrefetchLoader():
+    """
+    Produces the training batches of a PyTorch NNetWrapper.train in
+    numWorkers background threads, up to prefetch batches ahead of the
+    training loop: numBatches batches of batchSize examples sampled at random
+    with replacement, as float32 tensors (boards, pis, vs, weights), pinned
+    for fast copies to the GPU with pinMemory. weights is None unless the
+    examples have weights (see DedupExamples).
+
+    examples is a list of (board, pi, v), or anything with batch(ids), e.g.
+    a ReplayArrays, which then assembles the arrays itself.
+    """
+
+    def __init__(self, examples, batchSize, numBatches, numWorkers=1, prefetch=4, pinMemory=False):
+        self.examples = examples
+        self.batchSize = batchSize
+        self.numBatches = numBatches
+        self.numWorkers = numWorkers
+        self.prefetch = prefetch
+        self.pinMemory = pinMemory
+        self.weights = getattr(examples, 'weights', None)
+
+    def __len__(self):
+        return self.numBatches
+
+    def makeBatch(self):
+        ids = np.random.randint(len(self.examples), size=self.batchSize)
+        if hasattr(self.examples, 'batch'):
+            boards, pis, vs = self.examples.batch(ids)
+        else:
+            boards, pis, vs = zip(*[self.examples[i] for i in ids])
+        arrays = [boards, pis, vs] + ([] if self.weights is None else [self.weights[ids]])
+        # np.array of lists of Python floats is fastest without a dtype, cast afterwards
+        tensors = [torch.from_numpy(np.array(x).astype(np.float32, copy=False)) for x in arrays]
+        if self.pinMemory:
+            tensors = [tensor.pin_memory() for tensor in tensors]
+        if self.weights is None:
+            tensors.append(None)
+        return tuple(tensors)
+
+    def __iter__(self):
+        batches = queue.Queue(maxsize=self.prefetch)
+        stop = threading.Event()
+
+        def put(item):
+            while not stop.is_set():
+                try:
+                    batches.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+
+        def work(numBatches):
+            try:
+                for _ in range(numBatches):
+                    if not put(self.makeBatch()):
+                        return
+            except Exception as e:
+                put(e)
+            put(None)
+
+        shares = [len(ids) for ids in np.array_split(np.arange(self.numBatches), self.numWorkers)]
+        workers = [threading.Thread(target=work, args=(share,), daemon=True) for share in shares]
+        for worker in workers:
+            worker.start()
+        try:
+            running = len(workers)
+            while running:
+                batch = batches.get()
+                if batch is None:
+                    running -= 1
+                elif isinstance(batch, Exception):
+                    raise batch
+                else:
+                    yield batch
+        finally:
+            # also reached when the training loop stops early
+            stop.set()
+            for worker in workers:
+                worker.join()
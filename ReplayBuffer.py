@@ -0,0 +1,270 @@
+import glob
+import os
+import re
+
+import numpy as np
+
+
+class Shard():
+    """
+    The examples of one iteration in a ReplayBuffer, read from memory-mapped
+    .npy files, so they are only loaded into RAM when used. It is a sequence
+    of (board, pi, v) like the deques of Coach.trainExamplesHistory.
+    """
+
+    def __init__(self, prefix):
+        self.prefix = prefix
+        self.boards = np.load(prefix + '.boards.npy', mmap_mode='r')
+        self.pis = np.load(prefix + '.pis.npy', mmap_mode='r')
+        self.vs = np.load(prefix + '.vs.npy', mmap_mode='r')
+
+    def __len__(self):
+        return len(self.vs)
+
+    def __getitem__(self, i):
+        return self.boards[i], self.pis[i], self.vs[i]
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def nbytes(self):
+        return sum(os.path.getsize(self.prefix + suffix) for suffix in ['.boards.npy', '.pis.npy', '.vs.npy'])
+
+
+class ReplayArrays():
+    """
+    The examples of several Shards as one sequence of (board, pi, v), meant
+    to be sampled by index: batch reads just the requested examples from the
+    memory-mapped shards, so training does not hold the history in RAM. The
+    NNetWrapper.train of othello/pytorch and othello/keras accept it in place
+    of a list of examples.
+    """
+
+    def __init__(self, shards):
+        self.shards = shards
+        self.offsets = np.cumsum([0] + [len(shard) for shard in shards])
+
+    def __len__(self):
+        return int(self.offsets[-1])
+
+    def __getitem__(self, i):
+        k = np.searchsorted(self.offsets, i, side='right') - 1
+        return self.shards[k][i - self.offsets[k]]
+
+    def __iter__(self):
+        for shard in self.shards:
+            yield from shard
+
+    def batch(self, ids):
+        """
+        Returns:
+            boards, pis, vs: arrays of the examples with the given indices;
+                             pis and vs as float32
+        """
+        ids = np.asarray(ids)
+        which = np.searchsorted(self.offsets, ids, side='right') - 1
+        first = self.shards[0]
+        # addShard picks the board type of every shard, so a later shard may be wider
+        dtype = np.result_type(*[shard.boards.dtype for shard in self.shards])
+        boards = np.empty((len(ids),) + first.boards.shape[1:], dtype=dtype)
+        pis = np.empty((len(ids),) + first.pis.shape[1:], dtype=np.float32)
+        vs = np.empty(len(ids), dtype=np.float32)
+        for k in np.unique(which):
+            selected = which == k
+            shardIds = ids[selected] - self.offsets[k]
+            boards[selected] = self.shards[k].boards[shardIds]
+            pis[selected] = self.shards[k].pis[shardIds]
+            vs[selected] = self.shards[k].vs[shardIds]
+        return boards, pis, vs
+
+
+def hashRows(boards):
+    """
+    Returns:
+        hashes: a 64-bit hash of the bytes of every board, as uint64
+    """
+    rows = np.ascontiguousarray(boards).reshape(len(boards), -1).view(np.uint8)
+    rows = np.pad(rows, ((0, 0), (0, -rows.shape[1] % 8))).view(np.uint64)
+    hashes = np.zeros(len(rows), dtype=np.uint64)
+    with np.errstate(over='ignore'):
+        for word in rows.T:
+            # the splitmix64 finalizer, on the hash so far and the next 8 bytes
+            z = hashes ^ word
+            z = (z ^ (z >> np.uint64(30))) * np.uint64(0xbf58476d1ce4e5b9)
+            z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94d049bb133111eb)
+            hashes = z ^ (z >> np.uint64(31))
+    return hashes
+
+
+class DedupExamples():
+    """
+    Training examples where the duplicates of every board are merged into one
+    example whose pi and v are the averages of the duplicates'. It only keeps
+    an index of the rows of examples that every merged example stands for,
+    and averages them when the example is read, so over a ReplayArrays the
+    history stays in the memory-mapped shards. counts holds the number of
+    duplicates, and weights the counts scaled to mean 1: weighting the loss
+    of an example by it keeps the training objective of the raw examples,
+    with fewer samples per epoch. It offers the len, indexing and batch of
+    ReplayArrays.
+    """
+
+    def __init__(self, examples, chunkSize=4096):
+        self.examples = examples
+        self.numRaw = len(examples)
+        hashes = np.empty(self.numRaw, dtype=np.uint64)
+        for start in range(0, self.numRaw, chunkSize):
+            rows = np.arange(start, min(start + chunkSize, self.numRaw))
+            hashes[rows] = hashRows(self.read(rows)[0])
+
+        # number the merged examples in the order of their first duplicate
+        _, first, inverse, counts = np.unique(hashes, return_index=True, return_inverse=True, return_counts=True)
+        rank = np.argsort(first)
+        label = np.empty_like(rank)
+        label[rank] = np.arange(len(rank))
+        self.counts = counts[rank]
+        self.order = np.argsort(label[inverse], kind='stable')  # the rows of every merged example, in turn
+        self.starts = np.cumsum(self.counts) - self.counts
+        self.weights = (self.counts * len(self.counts) / max(1, self.numRaw)).astype(np.float32)
+
+    def read(self, rows):
+        if hasattr(self.examples, 'batch'):
+            return self.examples.batch(rows)
+        return tuple(np.array(x) for x in zip(*[self.examples[i] for i in rows]))
+
+    def __len__(self):
+        return len(self.counts)
+
+    def __getitem__(self, i):
+        boards, pis, vs = self.batch([i])
+        return boards[0], pis[0], vs[0]
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def batch(self, ids):
+        """
+        Returns:
+            boards, pis, vs: arrays of the examples with the given indices;
+                             pis and vs as float32
+        """
+        counts = self.counts[ids]
+        offsets = np.cumsum(counts) - counts
+        rows = self.order[np.arange(counts.sum()) - np.repeat(offsets - self.starts[ids], counts)]
+        boards, pis, vs = self.read(rows)
+        pis = np.add.reduceat(np.asarray(pis, dtype=np.float32), offsets) / counts[:, None]
+        vs = np.add.reduceat(np.asarray(vs, dtype=np.float32), offsets) / counts
+        return boards[offsets], pis.astype(np.float32), vs.astype(np.float32)
+
+
+class SymmetricExamples():
+    """
+    Training examples stored without their symmetric forms, which stands for
+    the examples expanded into all the symmetries of game.getSymmetries:
+    example i is example i // K of examples in symmetry i % K, for the K
+    symmetries, built on access from index permutations of the board cells
+    and actions. So its len, and the batches per epoch of an NNetWrapper,
+    are those of the expanded examples. It offers the len, indexing and
+    batch of ReplayArrays, over a list of examples or a ReplayArrays.
+    """
+
+    def __init__(self, game, examples):
+        self.examples = examples
+        shape = game.getBoardSize()
+        cells = np.arange(np.prod(shape)).reshape(shape)
+        symmetries = game.getSymmetries(cells, np.arange(game.getActionSize()))
+        self.boardPerms = np.array([np.asarray(board).reshape(-1) for board, _ in symmetries])
+        self.piPerms = np.array([np.asarray(pi) for _, pi in symmetries])
+        weights = getattr(examples, 'weights', None)
+        self.weights = None if weights is None else np.repeat(weights, len(self.boardPerms))
+
+        # the permutations only stand for getSymmetries if it merely moves cells and actions
+        rng = np.random.RandomState(0)
+        board, pi = rng.randint(-1, 2, size=shape), rng.random_sample(game.getActionSize())
+        for k, (symBoard, symPi) in enumerate(game.getSymmetries(board, pi)):
+            if not (np.array_equal(np.sort(self.boardPerms[k]), cells.reshape(-1))
+                    and np.array_equal(np.sort(self.piPerms[k]), np.arange(game.getActionSize()))
+                    and np.array_equal(board.reshape(-1)[self.boardPerms[k]], np.asarray(symBoard).reshape(-1))
+                    and np.array_equal(pi[self.piPerms[k]], np.asarray(symPi))):
+                raise ValueError(f'the symmetries of {type(game).__name__} are not index permutations')
+
+    def __len__(self):
+        return len(self.examples) * len(self.boardPerms)
+
+    def __getitem__(self, i):
+        board, pi, v = self.examples[i // len(self.boardPerms)]
+        board = np.asarray(board)
+        k = i % len(self.boardPerms)
+        return board.reshape(-1)[self.boardPerms[k]].reshape(board.shape), np.asarray(pi)[self.piPerms[k]], v
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def batch(self, ids):
+        """
+        Returns:
+            boards, pis, vs: arrays of the examples with the given indices
+        """
+        ids = np.asarray(ids)
+        exampleIds, ks = np.divmod(ids, len(self.boardPerms))
+        if hasattr(self.examples, 'batch'):
+            boards, pis, vs = self.examples.batch(exampleIds)
+        else:
+            boards, pis, vs = (np.array(x) for x in zip(*[self.examples[i] for i in exampleIds]))
+        boards = np.take_along_axis(boards.reshape(len(ids), -1), self.boardPerms[ks], axis=1).reshape(boards.shape)
+        pis = np.take_along_axis(pis, self.piPerms[ks], axis=1)
+        return boards, pis, vs
+
+
+class ReplayBuffer():
+    """
+    An append-only buffer of training examples in folder, where every
+    iteration writes its own shard once: boards as int8, policies as float16
+    and values as int8 (draws, whose values are tiny, become 0). Boards and
+    values that int8 cannot hold exactly keep a wider type.
+    """
+
+    def __init__(self, folder):
+        self.folder = os.path.abspath(folder)
+
+    def shards(self):
+        """
+        Returns:
+            prefixes: the file prefix of every complete shard, oldest first
+        """
+        files = glob.glob(os.path.join(self.folder, 'shard_*.vs.npy'))
+        return sorted(f[:-len('.vs.npy')] for f in files)
+
+    def addShard(self, examples):
+        """
+        Writes examples, a sequence of (board, pi, v), as a new shard.
+
+        Returns:
+            shard: the Shard reading the written examples
+        """
+        if not os.path.exists(self.folder):
+            os.makedirs(self.folder)
+        ids = [int(re.search(r'shard_(\d+)$', prefix).group(1)) for prefix in self.shards()]
+        prefix = os.path.join(self.folder, 'shard_%06d' % (max(ids, default=-1) + 1))
+
+        boards = np.array([board for board, _, _ in examples])
+        if np.array_equal(boards.astype(np.int8), boards):
+            boards = boards.astype(np.int8)
+        pis = np.array([pi for _, pi, _ in examples], dtype=np.float16)
+        vs = np.array([v for _, _, v in examples], dtype=np.float64)
+        if np.allclose(vs, np.rint(vs), atol=1e-3):
+            vs = np.rint(vs).astype(np.int8)
+
+        # the values are written last, so that shards only lists complete shards
+        for suffix, array in [('.boards.npy', boards), ('.pis.npy', pis), ('.vs.npy', vs)]:
+            with open(prefix + '.tmp', 'wb') as f:
+                np.save(f, array)
+            os.replace(prefix + '.tmp', prefix + suffix)
+        return Shard(prefix)
+
+    def removeShard(self, prefix):
+        for suffix in ['.vs.npy', '.pis.npy', '.boards.npy']:
+            os.remove(prefix + suffix)
@@ -0,0 +1,214 @@
+import argparse
+import logging
+import time
+
+import coloredlogs
+import numpy as np
+
+from Arena import Arena
+from Coach import Coach
+from MCTS import MCTS, MCTSPlayer
+from NeuralNet import NeuralNet
+from ParallelMCTS import ParallelMCTS
+from connect4.Connect4Game import Connect4Game
+from othello.OthelloGame import OthelloGame
+from othello.pytorch.NNet import NNetWrapper as NNet
+from utils import *
+
+"""
+use this script to measure the throughput of the search and self-play
+components with an untrained network, e.g.
+
+    python benchmark.py mcts-batch
+    python benchmark.py arena-batched --game connect4
+"""
+
+log = logging.getLogger(__name__)
+
+coloredlogs.install(level='INFO')
+
+
+def bench_mcts_batch(game, nnet, numMoves=4, numMCTSSims=256):
+    """
+    Reports the simulations per second of MCTS.getActionProb for several values
+    of args.mctsBatchSize.
+    """
+    for batchSize in [1, 8, 32, 64]:
+        args = dotdict({'numMCTSSims': numMCTSSims, 'cpuct': 1.0, 'mctsBatchSize': batchSize})
+        board, curPlayer = game.getInitBoard(), 1
+        start = time.time()
+        for _ in range(numMoves):
+            mcts = MCTS(game, nnet, args)
+            canonicalBoard = game.getCanonicalForm(board, curPlayer)
+            pi = mcts.getActionProb(canonicalBoard, temp=0)
+            board, curPlayer = game.getNextState(board, curPlayer, pi.index(1))
+        elapsed = time.time() - start
+        log.info('mctsBatchSize=%2d: %8.1f simulations/s', batchSize, numMoves * numMCTSSims / elapsed)
+
+
+def bench_mcts_search(game, nnet, numMoves=4, numMCTSSims=256):
+    """
+    Reports the simulations per second of the sequential MCTS.search over the
+    first numMoves moves of a game.
+    """
+    args = dotdict({'numMCTSSims': numMCTSSims, 'cpuct': 1.0})
+    board, curPlayer = game.getInitBoard(), 1
+    start = time.time()
+    for _ in range(numMoves):
+        mcts = MCTS(game, nnet, args)
+        canonicalBoard = game.getCanonicalForm(board, curPlayer)
+        pi = mcts.getActionProb(canonicalBoard, temp=0)
+        board, curPlayer = game.getNextState(board, curPlayer, pi.index(1))
+    elapsed = time.time() - start
+    log.info('MCTS.search: %8.1f simulations/s', numMoves * numMCTSSims / elapsed)
+
+
+def bench_mcts_threads(game, nnet, numMoves=4, numMCTSSims=256):
+    """
+    Reports the simulations per second of ParallelMCTS for several values of
+    args.numMCTSThreads.
+    """
+    for numThreads in [1, 2, 4, 8]:
+        args = dotdict({'numMCTSSims': numMCTSSims, 'cpuct': 1.0, 'numMCTSThreads': numThreads})
+        board, curPlayer = game.getInitBoard(), 1
+        start = time.time()
+        for _ in range(numMoves):
+            mcts = ParallelMCTS(game, nnet, args)
+            canonicalBoard = game.getCanonicalForm(board, curPlayer)
+            pi = mcts.getActionProb(canonicalBoard, temp=0)
+            board, curPlayer = game.getNextState(board, curPlayer, pi.index(1))
+        elapsed = time.time() - start
+        log.info('numMCTSThreads=%d: %8.1f simulations/s', numThreads, numMoves * numMCTSSims / elapsed)
+
+
+class RolloutNNet(NeuralNet):
+    """
+    Stands in for a trained network where the playing strength of searches is
+    compared: uniform priors, and the value of a board is the outcome of a
+    random game played from it.
+    """
+
+    def __init__(self, game):
+        self.game = game
+
+    def predict(self, board):
+        valids = self.game.getValidMoves(board, 1)
+        player = 1
+        while self.game.getGameEnded(board, player) == 0:
+            action = np.random.choice(np.flatnonzero(self.game.getValidMoves(board, player)))
+            board, player = self.game.getNextState(board, player, action)
+        return valids / np.sum(valids), player * self.game.getGameEnded(board, player)
+
+
+def bench_gumbel_arena(game, nnet, numGames=40, numMCTSSims=32, gumbelSims=8):
+    """
+    Plays Gumbel MCTS and PUCT MCTS with gumbelSims simulations per move
+    against PUCT MCTS with numMCTSSims, using RolloutNNet values (an untrained
+    network cannot tell the searches apart).
+    """
+    nnet = RolloutNNet(game)
+    reference = MCTSPlayer(game, nnet, dotdict({'numMCTSSims': numMCTSSims, 'cpuct': 1.0}))
+    for name, gumbel in [('PUCT', False), ('Gumbel', True)]:
+        player = MCTSPlayer(game, nnet, dotdict({'numMCTSSims': gumbelSims, 'cpuct': 1.0, 'gumbel': gumbel}))
+        wins, losses, draws = Arena(player, reference, game).playGames(numGames)
+        log.info('%s with %d simulations against PUCT with %d: %d wins, %d losses, %d draws',
+                 name, gumbelSims, numMCTSSims, wins, losses, draws)
+
+
+def bench_selfplay_lockstep(game, nnet, numEps=16, numMCTSSims=25):
+    """
+    Reports the training examples per second of numEps self-play episodes
+    played one at a time by Coach.executeEpisode, and in lockstep by
+    Coach.executeEpisodes for several values of args.selfPlayBatchSize.
+    """
+    args = dotdict({'numMCTSSims': numMCTSSims, 'cpuct': 1.0, 'tempThreshold': 15})
+    coach = Coach(game, nnet, args)
+    start = time.time()
+    numExamples = 0
+    for _ in range(numEps):
+        coach.mcts = MCTS(game, nnet, args)
+        numExamples += len(coach.executeEpisode())
+    log.info('executeEpisode:           %8.1f examples/s', numExamples / (time.time() - start))
+
+    for batchSize in [4, 16]:
+        coach = Coach(game, nnet, dotdict(args, selfPlayBatchSize=batchSize))
+        start = time.time()
+        numExamples = sum(len(examples) for examples in coach.executeEpisodes(numEps))
+        log.info('selfPlayBatchSize=%2d:     %8.1f examples/s', batchSize, numExamples / (time.time() - start))
+
+
+def bench_arena_batched(game, nnet, numGames=16, numMCTSSims=25):
+    """
+    Reports the moves per second of numGames arena games between two MCTS
+    players played one at a time by Arena.playGames, and in lockstep by
+    Arena.playGamesBatched for several batch sizes.
+    """
+    args = dotdict({'numMCTSSims': numMCTSSims, 'cpuct': 1.0})
+
+    class CountingPlayer(MCTSPlayer):
+        moves = 0
+
+        def __call__(self, canonicalBoard):
+            CountingPlayer.moves += 1
+            return super().__call__(canonicalBoard)
+
+        def steps(self, canonicalBoard):
+            CountingPlayer.moves += 1
+            return (yield from super().steps(canonicalBoard))
+
+    for batchSize in [1, 4, 16]:
+        arena = Arena(CountingPlayer(game, nnet, args), CountingPlayer(game, nnet, args), game)
+        CountingPlayer.moves = 0
+        start = time.time()
+        if batchSize == 1:
+            arena.playGames(numGames)
+        else:
+            arena.playGamesBatched(numGames, batchSize)
+        name = 'playGames' if batchSize == 1 else f'playGamesBatched({batchSize})'
+        log.info('%-22s %8.1f moves/s', name + ':', CountingPlayer.moves / (time.time() - start))
+
+
+def bench_train(game, nnet, numExamples=6400):
+    """
+    Reports the training batches per second of one epoch of NNetWrapper.train
+    on random examples.
+    """
+    from othello.pytorch.NNet import args as nnetArgs
+    rng = np.random.RandomState(0)
+    examples = [(rng.randint(-1, 2, size=game.getBoardSize()), list(rng.dirichlet(np.ones(game.getActionSize()))),
+                 float(rng.choice([-1, 1]))) for _ in range(numExamples)]
+    epochs = nnetArgs.epochs
+    nnetArgs['epochs'] = 1
+    try:
+        start = time.time()
+        nnet.train(examples)
+        log.info('NNetWrapper.train: %8.1f batches/s', numExamples // nnetArgs.batch_size / (time.time() - start))
+    finally:
+        nnetArgs['epochs'] = epochs
+
+
+BENCHMARKS = {
+    'arena-batched': bench_arena_batched,
+    'gumbel-arena': bench_gumbel_arena,
+    'mcts-batch': bench_mcts_batch,
+    'mcts-search': bench_mcts_search,
+    'mcts-threads': bench_mcts_threads,
+    'selfplay-lockstep': bench_selfplay_lockstep,
+    'train': bench_train,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('benchmark', choices=sorted(BENCHMARKS))
+    parser.add_argument('--game', choices=['othello', 'connect4'], default='othello')
+    parser.add_argument('--size', type=int, default=6, help='Othello board size')
+    cli = parser.parse_args()
+
+    g = OthelloGame(cli.size) if cli.game == 'othello' else Connect4Game()
+    nnet = NNet(g)  # the Othello network architecture fits any board size
+    BENCHMARKS[cli.benchmark](g, nnet)
+
+
+if __name__ == "__main__":
+    main()
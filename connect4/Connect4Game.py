@@ -4,6 +4,7 @@ import numpy as np
 sys.path.append('..')
 from Game import Game
 from .Connect4Logic import Board
+from utils import Zobrist
 
 
 class Connect4Game(Game):
@@ -14,6 +15,7 @@ class Connect4Game(Game):
     def __init__(self, height=None, width=None, win_length=None, np_pieces=None):
         Game.__init__(self)
         self._base_board = Board(height, width, win_length, np_pieces)
+        self.zobrist = Zobrist(self._base_board.height * self._base_board.width)
 
     def getInitBoard(self):
         return self._base_board.np_pieces
@@ -62,6 +64,13 @@ class Connect4Game(Game):
     def stringRepresentation(self, board):
         return board.tostring()
 
+    def getHashKey(self, board, parentBoard=None, parentKey=None, action=None):
+        if parentKey is None:
+            return self.zobrist.key(board)
+        # a move only fills the cell its stone dropped to in column action
+        row, = np.flatnonzero(parentBoard[:, action] + board[:, action])
+        return self.zobrist.nextKey(parentKey, [row * board.shape[1] + action], parentBoard, board)
+
     @staticmethod
     def display(board):
         print(" -----------------------")
@@ -3,6 +3,7 @@ import sys
 sys.path.append('..')
 from Game import Game
 from .GobangLogic import Board
+from utils import Zobrist
 import numpy as np
 
 
@@ -10,6 +11,7 @@ class GobangGame(Game):
     def __init__(self, n=15, nir=5):
         self.n = n
         self.n_in_row = nir
+        self.zobrist = Zobrist(n * n)
 
     def getInitBoard(self):
         # return initial board (numpy board)
@@ -100,6 +102,13 @@ class GobangGame(Game):
         # 8x8 numpy array (canonical board)
         return board.tostring()
 
+    def getHashKey(self, board, parentBoard=None, parentKey=None, action=None):
+        if parentKey is None:
+            return self.zobrist.key(board)
+        # a move only fills the cell of action, a pass changes no cell
+        cells = [action] if action < self.n * self.n else []
+        return self.zobrist.nextKey(parentKey, cells, parentBoard, board)
+
     @staticmethod
     def display(board):
         n = board.shape[0]
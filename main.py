@@ -18,13 +18,28 @@ args = dotdict({
     'updateThreshold': 0.6,     # During arena playoff, new neural net will be accepted if threshold or more of games are won.
     'maxlenOfQueue': 200000,    # Number of game examples to train the neural networks.
     'numMCTSSims': 25,          # Number of games moves for MCTS to simulate.
+    'mctsBatchSize': 1,         # Number of MCTS leaves sent to the neural network at once (1 = sequential search).
+    'selfPlayBatchSize': 1,     # Number of self-play games played in lockstep, their leaves evaluated together (1 = one game at a time).
+    'numSelfPlayWorkers': 1,    # Number of processes playing the self-play episodes (1 = in this process).
+    'asyncTraining': False,     # Overlap self-play, training and arena gating in separate processes (see Coach.learnAsync).
+    'maxVersionLag': 1,         # With asyncTraining, drop episodes of networks more than this many iterations older than the best one.
+    'maxTreeBytes': 2 ** 30,    # MCTS evicts the least recently visited nodes when its tree outgrows this many bytes.
+    'symmetries': False,        # Share MCTS nodes and evaluations between the symmetric forms of a board.
+    'evalCacheSize': 100000,    # Number of neural network evaluations cached per network version (0 = off).
     'arenaCompare': 40,         # Number of games to play during arena play to determine if new net will be accepted.
+    'numArenaWorkers': 1,       # Number of processes playing the arena games (1 = in this process).
+    'sprt': False,              # Stop the arena as soon as a sequential probability ratio test accepts or rejects the new net.
+    'sprtAlpha': 0.05,          # SPRT probability of accepting a new net that is not better (wins <= half the decided games).
+    'sprtBeta': 0.05,           # SPRT probability of rejecting a new net that wins updateThreshold of the decided games.
     'cpuct': 1,
 
     'checkpoint': './temp/',
     'load_model': False,
     'load_folder_file': ('/dev/models/8x100x50','best.pth.tar'),
     'numItersForTrainExamplesHistory': 20,
+    'dedupExamples': True,      # Merge the duplicate positions of the training set, averaging their targets and weighting them by count.
+    'lazySymmetries': True,     # Store each position once and build its symmetries when training instead of storing all of them.
+    'replayShards': True,       # Write every iteration's examples once to checkpoint/replay instead of pickling the history.
 
 })
 
@@ -50,7 +65,10 @@ def main():
         c.loadTrainExamples()
 
     log.info('Starting the learning process 🎉')
-    c.learn()
+    if args.asyncTraining:
+        c.learnAsync()
+    else:
+        c.learn()
 
 
 if __name__ == "__main__":
@@ -3,6 +3,7 @@ import sys
 sys.path.append('..')
 from Game import Game
 from .OthelloLogic import Board
+from utils import Zobrist
 import numpy as np
 
 class OthelloGame(Game):
@@ -18,6 +19,7 @@ class OthelloGame(Game):
 
     def __init__(self, n):
         self.n = n
+        self.zobrist = Zobrist(n * n)
 
     def getInitBoard(self):
         # return initial board (numpy board)
@@ -92,6 +94,13 @@ class OthelloGame(Game):
     def stringRepresentation(self, board):
         return board.tostring()
 
+    def getHashKey(self, board, parentBoard=None, parentKey=None, action=None):
+        if parentKey is None:
+            return self.zobrist.key(board)
+        # the placed and the flipped pieces, the other cells only swapped colours
+        cells = np.flatnonzero(parentBoard + board).tolist()
+        return self.zobrist.nextKey(parentKey, cells, parentBoard, board)
+
     def stringRepresentationReadable(self, board):
         board_s = "".join(self.square_content[square] for row in board for square in row)
         return board_s
@@ -24,6 +24,8 @@ args = dotdict({
 })
 
 class NNetWrapper(NeuralNet):
+    weightedTraining = True
+
     def __init__(self, game):
         self.nnet = onnet(game, args)
         self.board_x, self.board_y = game.getBoardSize()
@@ -31,8 +33,25 @@ class NNetWrapper(NeuralNet):
 
     def train(self, examples):
         """
-        examples: list of examples, each example is of form (board, pi, v)
+        examples: list of examples, each example is of form (board, pi, v), or
+                  a ReplayArrays, whose batches are read by index. The losses
+                  are weighted by examples.weights if it has them (see
+                  DedupExamples).
         """
+        if hasattr(examples, 'batch'):
+            weights = getattr(examples, 'weights', None)
+
+            def batches():
+                while True:
+                    ids = np.random.randint(len(examples), size=args.batch_size)
+                    boards, pis, vs = examples.batch(ids)
+                    if weights is None:
+                        yield boards.astype(np.float32), (pis, vs)
+                    else:
+                        yield boards.astype(np.float32), (pis, vs), (weights[ids], weights[ids])
+
+            self.nnet.model.fit(batches(), steps_per_epoch=max(1, len(examples) // args.batch_size), epochs=args.epochs)
+            return
         input_boards, target_pis, target_vs = list(zip(*examples))
         input_boards = np.asarray(input_boards)
         target_pis = np.asarray(target_pis)
@@ -55,6 +74,13 @@ class NNetWrapper(NeuralNet):
         #print('PREDICTION TIME TAKEN : {0:03f}'.format(time.time()-start))
         return pi[0], v[0]
 
+    def predict_batch(self, boards):
+        """
+        boards: list of np arrays with boards
+        """
+        pi, v = self.nnet.model.predict(np.asarray(boards), verbose=False)
+        return pi, v
+
     def save_checkpoint(self, folder='checkpoint', filename='checkpoint.pth.tar'):
         # change extension
         filename = filename.split(".")[0] + ".h5"
@@ -8,6 +8,7 @@ from tqdm import tqdm
 sys.path.append('../../')
 from utils import *
 from NeuralNet import NeuralNet
+from PrefetchLoader import PrefetchLoader
 
 import torch
 import torch.optim as optim
@@ -21,10 +22,14 @@ args = dotdict({
     'batch_size': 64,
     'cuda': torch.cuda.is_available(),
     'num_channels': 512,
+    'loader_workers': 1,  # threads assembling the training batches
+    'prefetch': 4,  # batches assembled ahead of the training loop
 })
 
 
 class NNetWrapper(NeuralNet):
+    weightedTraining = True
+
     def __init__(self, game):
         self.nnet = onnet(game, args)
         self.board_x, self.board_y = game.getBoardSize()
@@ -35,7 +40,10 @@ class NNetWrapper(NeuralNet):
 
     def train(self, examples):
         """
-        examples: list of examples, each example is of form (board, pi, v)
+        examples: list of examples, each example is of form (board, pi, v), or
+                  a ReplayArrays, whose batches are read by index. The losses
+                  are weighted by examples.weights if it has them (see
+                  DedupExamples).
         """
         optimizer = optim.Adam(self.nnet.parameters())
 
@@ -47,22 +55,20 @@ class NNetWrapper(NeuralNet):
 
             batch_count = int(len(examples) / args.batch_size)
 
-            t = tqdm(range(batch_count), desc='Training Net')
-            for _ in t:
-                sample_ids = np.random.randint(len(examples), size=args.batch_size)
-                boards, pis, vs = list(zip(*[examples[i] for i in sample_ids]))
-                boards = torch.FloatTensor(np.array(boards).astype(np.float64))
-                target_pis = torch.FloatTensor(np.array(pis))
-                target_vs = torch.FloatTensor(np.array(vs).astype(np.float64))
-
+            loader = PrefetchLoader(examples, args.batch_size, batch_count, numWorkers=args.loader_workers,
+                                    prefetch=args.prefetch, pinMemory=args.cuda)
+            t = tqdm(loader, desc='Training Net')
+            for boards, target_pis, target_vs, target_ws in t:
                 # predict
                 if args.cuda:
-                    boards, target_pis, target_vs = boards.contiguous().cuda(), target_pis.contiguous().cuda(), target_vs.contiguous().cuda()
+                    boards, target_pis, target_vs = boards.cuda(non_blocking=True), target_pis.cuda(non_blocking=True), target_vs.cuda(non_blocking=True)
+                    if target_ws is not None:
+                        target_ws = target_ws.cuda(non_blocking=True)
 
                 # compute output
                 out_pi, out_v = self.nnet(boards)
-                l_pi = self.loss_pi(target_pis, out_pi)
-                l_v = self.loss_v(target_vs, out_v)
+                l_pi = self.loss_pi(target_pis, out_pi, target_ws)
+                l_v = self.loss_v(target_vs, out_v, target_ws)
                 total_loss = l_pi + l_v
 
                 # record loss
@@ -93,11 +99,28 @@ class NNetWrapper(NeuralNet):
         # print('PREDICTION TIME TAKEN : {0:03f}'.format(time.time()-start))
         return torch.exp(pi).data.cpu().numpy()[0], v.data.cpu().numpy()[0]
 
-    def loss_pi(self, targets, outputs):
-        return -torch.sum(targets * outputs) / targets.size()[0]
+    def predict_batch(self, boards):
+        """
+        boards: list of np arrays with boards
+        """
+        boards = torch.FloatTensor(np.array(boards).astype(np.float64))
+        if args.cuda: boards = boards.contiguous().cuda()
+        boards = boards.view(-1, self.board_x, self.board_y)
+        self.nnet.eval()
+        with torch.no_grad():
+            pi, v = self.nnet(boards)
+
+        return torch.exp(pi).data.cpu().numpy(), v.data.cpu().numpy()
+
+    def loss_pi(self, targets, outputs, weights=None):
+        if weights is None:
+            return -torch.sum(targets * outputs) / targets.size()[0]
+        return -torch.sum(weights * torch.sum(targets * outputs, 1)) / targets.size()[0]
 
-    def loss_v(self, targets, outputs):
-        return torch.sum((targets - outputs.view(-1)) ** 2) / targets.size()[0]
+    def loss_v(self, targets, outputs, weights=None):
+        if weights is None:
+            return torch.sum((targets - outputs.view(-1)) ** 2) / targets.size()[0]
+        return torch.sum(weights * (targets - outputs.view(-1)) ** 2) / targets.size()[0]
 
     def save_checkpoint(self, folder='checkpoint', filename='checkpoint.pth.tar'):
         filepath = os.path.join(folder, filename)
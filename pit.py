@@ -1,5 +1,6 @@
 import Arena
-from MCTS import MCTS
+from MCTS import MCTSPlayer, PonderingMCTSPlayer
+from ParallelMCTS import RootParallelMCTS
 from othello.OthelloGame import OthelloGame
 from othello.OthelloPlayers import *
 from othello.pytorch.NNet import NNetWrapper as NNet
@@ -15,6 +16,8 @@ any agent.
 
 mini_othello = False  # Play in 6x6 instead of the normal 8x8.
 human_vs_cpu = True
+root_workers = 0  # Search player 1's moves in this many processes and merge their visit counts (0 = off).
+ponder = human_vs_cpu  # Let player 1 search while the human thinks.
 
 if mini_othello:
     g = OthelloGame(6)
@@ -31,21 +34,26 @@ hp = HumanOthelloPlayer(g).play
 # nnet players
 n1 = NNet(g)
 if mini_othello:
-    n1.load_checkpoint('./pretrained_models/othello/pytorch/','6x100x25_best.pth.tar')
+    n1_file = ('./pretrained_models/othello/pytorch/','6x100x25_best.pth.tar')
 else:
-    n1.load_checkpoint('./pretrained_models/othello/pytorch/','8x8_100checkpoints_best.pth.tar')
-args1 = dotdict({'numMCTSSims': 50, 'cpuct':1.0})
-mcts1 = MCTS(g, n1, args1)
-n1p = lambda x: np.argmax(mcts1.getActionProb(x, temp=0))
+    n1_file = ('./pretrained_models/othello/pytorch/','8x8_100checkpoints_best.pth.tar')
+n1.load_checkpoint(*n1_file)
+args1 = dotdict({'numMCTSSims': 50, 'cpuct':1.0, 'earlyStopping': True})
+if root_workers:
+    rpmcts1 = RootParallelMCTS(g, NNet, *n1_file, dotdict(args1, numMCTSWorkers=root_workers))
+    n1p = lambda x: np.argmax(rpmcts1.getActionProb(x, temp=0))
+elif ponder:
+    n1p = PonderingMCTSPlayer(g, n1, args1)
+else:
+    n1p = MCTSPlayer(g, n1, args1)
 
 if human_vs_cpu:
     player2 = hp
 else:
     n2 = NNet(g)
     n2.load_checkpoint('./pretrained_models/othello/pytorch/', '8x8_100checkpoints_best.pth.tar')
-    args2 = dotdict({'numMCTSSims': 50, 'cpuct': 1.0})
-    mcts2 = MCTS(g, n2, args2)
-    n2p = lambda x: np.argmax(mcts2.getActionProb(x, temp=0))
+    args2 = dotdict({'numMCTSSims': 50, 'cpuct': 1.0, 'earlyStopping': True})
+    n2p = MCTSPlayer(g, n2, args2)
 
     player2 = n2p  # Player 2 is neural network if it's cpu vs cpu.
 
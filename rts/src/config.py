@@ -464,7 +464,7 @@ class Configuration:
                          onehot_encoder,
                          player_model_file):
                 from rts.keras.NNet import NNetWrapper as NNet
-                from MCTS import MCTS
+                from MCTS import MCTSPlayer
 
                 if onehot_encoder:
                     encoder = OneHotEncoder()
@@ -473,8 +473,7 @@ class Configuration:
                 n1 = NNet(g, encoder)
                 n1.load_checkpoint('.\\..\\temp\\', player_model_file)
                 args1 = dotdict(player_config or {'numMCTSSims': 2, 'cpuct': 1.0})
-                mcts1 = MCTS(g, n1, args1)
-                self.play = lambda x: np.argmax(mcts1.getActionProb(x, temp=0))
+                self.play = MCTSPlayer(g, n1, args1)
 
     class _LearnArgs:
         def __init__(self,
@@ -484,6 +483,7 @@ class Configuration:
                      update_threshold,
                      maxlen_of_queue,
                      num_mcts_sims,
+                     max_tree_bytes,
                      arena_compare,
                      cpuct,
                      checkpoint,
@@ -500,6 +500,7 @@ class Configuration:
             self.numMCTSSims = num_mcts_sims  # How many MCTS tree searches are performing (mind that this MCTS doesnt use simulations)
             self.arenaCompare = arena_compare  # How many comparisons are made between old and new model
             self.cpuct = cpuct  # search parameter for MCTS
+            self.maxTreeBytes = max_tree_bytes  # MCTS evicts nodes when its tree outgrows this many bytes (None = no limit)
 
             self.checkpoint = checkpoint
             self.load_model = load_model  # Load training examples from file - WARNING - this is disabled in RTSPlayers.py because of memory errors received when loading data from file
@@ -509,6 +510,10 @@ class Configuration:
             self.save_train_examples = save_train_examples
             self.load_train_examples = load_train_examples
 
+        def get(self, name, default=None):
+            # Coach and MCTS read their optional arguments like a dotdict
+            return getattr(self, name, default)
+
     class BoardTile:
         def __init__(self,
                      player: int,
@@ -567,6 +572,7 @@ class Configuration:
                  update_threshold: float = 0.6,
                  maxlen_of_queue: int = 6400,
                  num_mcts_sims: int = 10,
+                 max_tree_bytes: int = 2 ** 30,
                  arena_compare: int = 10,
                  cpuct: float = 1,
                  checkpoint: str = '.\\..\\temp\\',
@@ -709,6 +715,7 @@ class Configuration:
         :param update_threshold: Percentage of how much wins should newer model have to be accepted
         :param maxlen_of_queue: How many train examples can be stored in each iteration
         :param num_mcts_sims: How many MCTS sims are executed in each game episode while learning
+        :param max_tree_bytes: How many bytes the MCTS tree may take while learning before its least recently visited nodes are evicted (None for no limit)
         :param arena_compare: How many comparations of newer and older model should be made before evaluating which is better
         :param cpuct: Exploration parameter for MCTS
         :param checkpoint: folder where checkpoints should be saved while learning
@@ -794,6 +801,7 @@ class Configuration:
             update_threshold=update_threshold,
             maxlen_of_queue=maxlen_of_queue,
             num_mcts_sims=num_mcts_sims,
+            max_tree_bytes=max_tree_bytes,
             arena_compare=arena_compare,
             cpuct=cpuct,
             checkpoint=checkpoint,
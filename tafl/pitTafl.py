@@ -2,7 +2,7 @@
 # Note: Run this file from Arena directory (the one above /tafl)
 
 import Arena
-from MCTS import MCTS
+from MCTS import MCTSPlayer
 from tafl.TaflGame import TaflGame, display
 from tafl.TaflPlayers import *
 #from tafl.keras.NNet import NNetWrapper as NNet
@@ -26,8 +26,7 @@ hp = HumanTaflPlayer(g).play
 #n1 = NNet(g)
 #n1.load_checkpoint('./pretrained_models/tafl/keras/','6x100x25_best.pth.tar')
 #args1 = dotdict({'numMCTSSims': 50, 'cpuct':1.0})
-#mcts1 = MCTS(g, n1, args1)
-#n1p = lambda x: np.argmax(mcts1.getActionProb(x, temp=0))
+#n1p = MCTSPlayer(g, n1, args1)
 
 
 arena = Arena.Arena(hp, gp, g, display=display)
@@ -21,7 +21,7 @@
 import unittest
 
 import Arena
-from MCTS import MCTS
+from MCTS import MCTSPlayer
 
 from othello.OthelloGame import OthelloGame
 from othello.OthelloPlayers import RandomPlayer
@@ -60,8 +60,7 @@ class TestAllGames(unittest.TestCase):
         rp = RandomPlayer(game).play
 
         args = dotdict({'numMCTSSims': 25, 'cpuct': 1.0})
-        mcts = MCTS(game, neural_net(game), args)
-        n1p = lambda x: np.argmax(mcts.getActionProb(x, temp=0))
+        n1p = MCTSPlayer(game, neural_net(game), args)
 
         arena = Arena.Arena(n1p, rp, game)
         print(arena.playGames(2, verbose=False))
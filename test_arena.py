@@ -0,0 +1,100 @@
+"""
+Tests for Arena.py. They use the cheap stand-in network of test_mcts.py, so
+they run without PyTorch or Keras:
+
+    python -m pytest test_arena.py
+"""
+
+import unittest
+
+import numpy as np
+
+from Arena import Arena, sprtBounds
+from MCTS import MCTSPlayerFactory
+from test_mcts import DummyNNet
+from tictactoe.TicTacToeGame import TicTacToeGame
+from utils import *
+
+
+class ScriptedArena(Arena):
+    """
+    An Arena whose games are won by the player named 'strong', and drawn
+    between equal players.
+    """
+
+    def playGame(self, verbose=False):
+        if self.player1 == self.player2:
+            return 1e-4
+        return 1 if self.player1 == 'strong' else -1
+
+
+class TestArena(unittest.TestCase):
+
+    def setUp(self):
+        self.game = TicTacToeGame()
+        self.factories = (MCTSPlayerFactory(self.game, DummyNNet, None, None, dotdict({'numMCTSSims': 10, 'cpuct': 1.0})),
+                          MCTSPlayerFactory(self.game, DummyNNet, None, None, dotdict({'numMCTSSims': 40, 'cpuct': 1.0})))
+
+    def seededSerialResults(self, player1, player2, num):
+        """
+        Plays the games of playGamesParallel/playGamesBatched after np.random.seed(0)
+        one at a time with playGame.
+        """
+        np.random.seed(0)
+        seeds = np.random.randint(2 ** 31, size=num)
+        results = []
+        for i, seed in enumerate(seeds):
+            np.random.seed(seed)
+            if i < num // 2:
+                results.append(Arena(player1, player2, self.game).playGame())
+            else:
+                results.append(-Arena(player2, player1, self.game).playGame())
+        return results.count(1), results.count(-1), num - results.count(1) - results.count(-1)
+
+    def test_parallel_games_match_seeded_serial_games(self):
+        player1, player2 = self.factories[0](), self.factories[1]()
+        expected = self.seededSerialResults(player1, player2, 8)
+
+        # every game has its own seed, so the results do not depend on the number of workers
+        arena = Arena(player1, player2, self.game, playerFactories=self.factories)
+        for workers in [2, 3]:
+            np.random.seed(0)
+            self.assertEqual(arena.playGames(8, workers=workers), expected)
+
+    def test_batched_games_match_seeded_serial_games(self):
+        player1, player2 = self.factories[0](), self.factories[1]()
+        expected = self.seededSerialResults(player1, player2, 8)
+
+        for batchSize in [1, 3, 8]:
+            player1, player2 = self.factories[0](), self.factories[1]()
+            np.random.seed(0)
+            self.assertEqual(Arena(player1, player2, self.game).playGamesBatched(8, batchSize), expected)
+        # the leaves of the games in flight were evaluated together
+        self.assertEqual(player1.nnet.predict_calls, 0)
+        self.assertLess(player1.nnet.predict_batch_calls, player1.nnet.predict_batch_boards / 2)
+
+    def test_parallel_games_need_player_factories(self):
+        arena = Arena(self.factories[0](), self.factories[1](), self.game)
+        with self.assertRaises(ValueError):
+            arena.playGames(2, workers=2)
+
+
+    def test_sprt_stops_once_decided(self):
+        lower, upper = sprtBounds(0.05, 0.05)
+        arena = ScriptedArena('strong', 'weak', None)
+        oneWon, twoWon, draws, llr = arena.playGamesSPRT(100, 0.5, 0.6)
+        # every win adds log(0.6 / 0.5) = 0.18
+        self.assertEqual((oneWon, twoWon, draws), (17, 0, 0))
+        self.assertGreaterEqual(llr, upper)
+        self.assertEqual((arena.player1, arena.player2), ('strong', 'weak'))
+
+        # every loss adds log(0.4 / 0.5) = -0.22
+        oneWon, twoWon, draws, llr = ScriptedArena('weak', 'strong', None).playGamesSPRT(100, 0.5, 0.6)
+        self.assertEqual((oneWon, twoWon, draws), (0, 14, 0))
+        self.assertLessEqual(llr, lower)
+
+    def test_sprt_plays_all_games_without_evidence(self):
+        self.assertEqual(ScriptedArena('weak', 'weak', None).playGamesSPRT(10, 0.5, 0.6), (0, 0, 10, 0.))
+
+if __name__ == '__main__':
+    unittest.main()
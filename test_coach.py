@@ -0,0 +1,126 @@
+"""
+Tests for the self-play in Coach.py. They use the cheap stand-in network of
+test_mcts.py, so they run without PyTorch or Keras:
+
+    python -m pytest test_coach.py
+"""
+
+import multiprocessing
+import tempfile
+import unittest
+
+import numpy as np
+
+from Coach import Coach
+from MCTS import MCTS
+from test_mcts import DummyNNet
+from tictactoe.TicTacToeGame import TicTacToeGame
+from utils import *
+
+
+class TestCoach(unittest.TestCase):
+
+    def setUp(self):
+        self.game = TicTacToeGame()
+        self.args = dotdict({'numMCTSSims': 25, 'cpuct': 1.0, 'tempThreshold': 4})
+
+    def assertExamplesEqual(self, examples, expected):
+        self.assertEqual(len(examples), len(expected))
+        for (board, pi, v), (board2, pi2, v2) in zip(examples, expected):
+            np.testing.assert_array_equal(board, board2)
+            np.testing.assert_allclose(pi, pi2)
+            self.assertEqual(v, v2)
+
+    def test_lockstep_episodes_match_execute_episode(self):
+        coach = Coach(self.game, DummyNNet(self.game), self.args)
+        np.random.seed(0)
+        expected = []
+        for _ in range(3):
+            coach.mcts = MCTS(self.game, coach.nnet, self.args)
+            expected.append(coach.executeEpisode())
+
+        # one game at a time draws the same random numbers as executeEpisode
+        np.random.seed(0)
+        coach = Coach(self.game, DummyNNet(self.game), dotdict(self.args, selfPlayBatchSize=1))
+        for examples, expectedExamples in zip(coach.executeEpisodes(3), expected):
+            self.assertExamplesEqual(examples, expectedExamples)
+
+    def test_lockstep_episodes_share_network_calls(self):
+        nnet = DummyNNet(self.game)
+        coach = Coach(self.game, nnet, dotdict(self.args, selfPlayBatchSize=3))
+        episodes = list(coach.executeEpisodes(5))
+        self.assertEqual(len(episodes), 5)
+        for examples in episodes:
+            # 8 symmetries of every move, and the outcome from the point of view of each mover
+            self.assertEqual(len(examples) % 8, 0)
+            for board, pi, v in examples:
+                self.assertEqual(board.shape, (3, 3))
+                self.assertAlmostEqual(sum(pi), 1.0)
+                self.assertIn(v, [-1, 1, 1e-4, -1e-4])
+        self.assertEqual(nnet.predict_calls, 0)
+        self.assertLess(nnet.predict_batch_calls, nnet.predict_batch_boards / 2)
+
+    def test_parallel_episodes_match_seeded_episodes(self):
+        folder = tempfile.mkdtemp()
+        args = dotdict(self.args, numSelfPlayWorkers=2, checkpoint=folder)
+        coach = Coach(self.game, DummyNNet(self.game), args)
+        episodes = list(coach.executeEpisodesParallel(4, seed=10))
+
+        expected = []
+        for seed in range(10, 14):
+            np.random.seed(seed)
+            coach.mcts = MCTS(self.game, coach.nnet, args)
+            expected.append(coach.executeEpisode())
+        # the episodes arrive in the order they finish
+        key = lambda examples: [(board.tobytes(), tuple(pi), v) for board, pi, v in examples]
+        for examples, expectedExamples in zip(sorted(episodes, key=key), sorted(expected, key=key)):
+            self.assertExamplesEqual(examples, expectedExamples)
+
+
+    def test_async_training_runs_all_iterations(self):
+        args = dotdict(self.args, numIters=2, numEps=3, arenaCompare=2, updateThreshold=0.6, maxlenOfQueue=1000,
+                       numItersForTrainExamplesHistory=20, numSelfPlayWorkers=2, checkpoint=tempfile.mkdtemp())
+        coach = Coach(self.game, DummyNNet(self.game), args)
+        bestVersion = coach.learnAsync()
+
+        self.assertIn(bestVersion, [0, 1, 2])
+        self.assertEqual(len(coach.trainExamplesHistory), 2)
+        for iterationTrainExamples in coach.trainExamplesHistory:
+            # at least 5 moves of every one of the 3 episodes, in 8 symmetries
+            self.assertGreaterEqual(len(iterationTrainExamples), 3 * 5 * 8)
+        self.assertEqual(multiprocessing.active_children(), [])
+
+    def test_lazy_symmetries_store_each_position_once(self):
+        args = dotdict(self.args, lazySymmetries=True, maxlenOfQueue=800)
+        np.random.seed(0)
+        coach = Coach(self.game, DummyNNet(self.game), self.args)
+        expected = coach.executeEpisode()
+        np.random.seed(0)
+        coach = Coach(self.game, DummyNNet(self.game), args)
+        examples = coach.executeEpisode()
+
+        # only the symmetry that is the position itself is kept
+        board = np.array([[1, 1, 0], [0, -1, 0], [0, 0, 0]])
+        identity = [np.array_equal(b, board) for b, _ in self.game.getSymmetries(board, np.zeros(10))].index(True)
+        self.assertExamplesEqual(examples, expected[identity::8])
+        self.assertEqual(coach.getMaxlenOfQueue(), 100)
+
+    def test_lazy_symmetries_keep_the_batches_per_epoch(self):
+        batchSize = 8
+        trainExamples = {}
+        for lazySymmetries in [False, True]:
+            np.random.seed(0)
+            coach = Coach(self.game, DummyNNet(self.game), dotdict(self.args, lazySymmetries=lazySymmetries))
+            coach.trainExamplesHistory = [coach.executeEpisode() for _ in range(2)]
+            trainExamples[lazySymmetries] = coach.getTrainExamples()
+
+        expanded, lazy = trainExamples[False], trainExamples[True]
+        self.assertEqual(len(lazy), len(expanded))
+        # the batch_count of an NNetWrapper.train
+        self.assertEqual(int(len(lazy) / batchSize), int(len(expanded) / batchSize))
+        forms = lambda examples: sorted((board.tobytes(), np.asarray(pi).tobytes(), v) for board, pi, v in examples)
+        self.assertEqual(forms(lazy), forms(expanded))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,552 @@
+"""
+Tests for the search in MCTS.py. They use a cheap deterministic stand-in for the
+neural network, so they run without PyTorch or Keras:
+
+    python -m pytest test_mcts.py
+"""
+
+import sys
+import threading
+import time
+import unittest
+import zlib
+
+import numpy as np
+
+from CachedNNet import CachedNNet
+from Game import Game
+from MCTS import MCTS, PonderingMCTSPlayer
+from NeuralNet import NeuralNet
+from ParallelMCTS import ParallelMCTS, RootParallelMCTS
+from connect4.Connect4Game import Connect4Game
+from gobang.GobangGame import GobangGame
+from othello.OthelloGame import OthelloGame
+from tictactoe.TicTacToeGame import TicTacToeGame
+from utils import *
+
+
+class DummyNNet(NeuralNet):
+    """
+    Returns fixed pseudo-random priors and values that only depend on the board,
+    and counts how often it was called.
+    """
+
+    def __init__(self, game):
+        self.action_size = game.getActionSize()
+        self.predict_calls = 0
+        self.predict_batch_calls = 0
+        self.predict_batch_boards = 0
+
+    def evaluate(self, board):
+        rng = np.random.RandomState(zlib.crc32(np.ascontiguousarray(board).tobytes()))
+        pi = rng.random_sample(self.action_size)
+        return pi / np.sum(pi), rng.uniform(-1, 1)
+
+    def predict(self, board):
+        self.predict_calls += 1
+        return self.evaluate(board)
+
+    def predict_batch(self, boards):
+        self.predict_batch_calls += 1
+        self.predict_batch_boards += len(boards)
+        pis, vs = zip(*[self.evaluate(board) for board in boards])
+        return np.array(pis), np.array(vs)
+
+
+class LineGame(Game):
+    """
+    A game of length numMoves with two actions per move, used to build searches
+    deeper than the recursion limit.
+    """
+
+    def __init__(self, numMoves):
+        self.numMoves = numMoves
+
+    def getInitBoard(self):
+        return np.zeros(1, dtype=np.int64)
+
+    def getActionSize(self):
+        return 2
+
+    def getNextState(self, board, player, action):
+        return board + 1, -player
+
+    def getValidMoves(self, board, player):
+        return np.ones(2)
+
+    def getGameEnded(self, board, player):
+        return 0 if board[0] < self.numMoves else 1e-4
+
+    def getCanonicalForm(self, board, player):
+        return board
+
+    def stringRepresentation(self, board):
+        return board.tobytes()
+
+
+def referenceSearch(game, nnet, canonicalBoard, numMCTSSims, cpuct=1.0):
+    """
+    The original dict-based recursive MCTS, used as a reference for the search
+    results of MCTS. Returns the visit counts of the root edges.
+    """
+    Qsa, Nsa, Ns, Ps, Es, Vs = {}, {}, {}, {}, {}, {}
+
+    def search(board):
+        s = game.stringRepresentation(board)
+        if s not in Es:
+            Es[s] = game.getGameEnded(board, 1)
+        if Es[s] != 0:
+            return -Es[s]
+        if s not in Ps:
+            pi, v = nnet.predict(board)
+            Vs[s] = game.getValidMoves(board, 1)
+            Ps[s] = pi * Vs[s]
+            Ps[s] /= np.sum(Ps[s])
+            Ns[s] = 0
+            return -v
+
+        cur_best, best_act = -float('inf'), -1
+        for a in range(game.getActionSize()):
+            if Vs[s][a]:
+                if (s, a) in Qsa:
+                    u = Qsa[(s, a)] + cpuct * Ps[s][a] * np.sqrt(Ns[s]) / (1 + Nsa[(s, a)])
+                else:
+                    u = cpuct * Ps[s][a] * np.sqrt(Ns[s] + 1e-8)
+                if u > cur_best:
+                    cur_best, best_act = u, a
+        a = best_act
+        next_s, next_player = game.getNextState(board, 1, a)
+        v = search(game.getCanonicalForm(next_s, next_player))
+
+        if (s, a) in Qsa:
+            Qsa[(s, a)] = (Nsa[(s, a)] * Qsa[(s, a)] + v) / (Nsa[(s, a)] + 1)
+            Nsa[(s, a)] += 1
+        else:
+            Qsa[(s, a)] = v
+            Nsa[(s, a)] = 1
+        Ns[s] += 1
+        return -v
+
+    for _ in range(numMCTSSims):
+        search(canonicalBoard)
+    s = game.stringRepresentation(canonicalBoard)
+    return np.array([Nsa.get((s, a), 0) for a in range(game.getActionSize())])
+
+
+class TestMCTS(unittest.TestCase):
+
+    def setUp(self):
+        self.game = TicTacToeGame()
+        self.board = self.game.getInitBoard()
+
+    def rootCounts(self, mcts, board=None):
+        board = self.board if board is None else board
+        return mcts.nodes.Nsa[mcts.getNode(board)].copy()
+
+    def test_search_matches_reference(self):
+        for game, moves in [(TicTacToeGame(), [[], [4], [4, 0, 8]]), (OthelloGame(6), [[], [8, 7]])]:
+            for moveList in moves:
+                board, player = game.getInitBoard(), 1
+                for action in moveList:
+                    board, player = game.getNextState(board, player, action)
+                board = game.getCanonicalForm(board, player)
+
+                nnet = DummyNNet(game)
+                mcts = MCTS(game, nnet, dotdict({'numMCTSSims': 200, 'cpuct': 1.0}))
+                mcts.getActionProb(board)
+                np.testing.assert_array_equal(mcts.nodes.Nsa[mcts.getNode(board)],
+                                              referenceSearch(game, nnet, board, 200))
+
+    def test_batched_search_runs_all_simulations(self):
+        for batchSize in [2, 8, 32]:
+            nnet = DummyNNet(self.game)
+            args = dotdict({'numMCTSSims': 50, 'cpuct': 1.0, 'mctsBatchSize': batchSize})
+            mcts = MCTS(self.game, nnet, args)
+            probs = mcts.getActionProb(self.board, temp=1)
+
+            # the first simulation only expands the root
+            self.assertEqual(np.sum(self.rootCounts(mcts)), 49)
+            self.assertAlmostEqual(sum(probs), 1.0)
+            self.assertEqual(nnet.predict_calls, 0)
+            self.assertLess(nnet.predict_batch_calls, 50)
+            self.assertFalse(mcts.VLsa)
+            self.assertFalse(mcts.VLs)
+
+    def test_batched_search_fills_batches(self):
+        game = OthelloGame(6)
+        for batchSize in [8, 32, 64]:
+            nnet = DummyNNet(game)
+            args = dotdict({'numMCTSSims': 400, 'cpuct': 1.0, 'mctsBatchSize': batchSize})
+            MCTS(game, nnet, args).getActionProb(game.getInitBoard())
+            self.assertGreaterEqual(nnet.predict_batch_boards / nnet.predict_batch_calls, batchSize / 2)
+
+    def test_pick_action_matches_scalar_puct(self):
+        mcts = MCTS(self.game, DummyNNet(self.game), dotdict({'numMCTSSims': 50, 'cpuct': 1.0}))
+        nodes = mcts.nodes
+        rng = np.random.RandomState(0)
+        for i in range(200):
+            node = nodes.add(str(i), 0)
+            nodes.Vs[node] = rng.rand(nodes.actionSize) > 0.3
+            nodes.Vs[node, 0] = True
+            # few distinct priors and values to exercise tie-breaking
+            nodes.Ps[node] = rng.randint(1, 3, nodes.actionSize) / 10
+            nodes.Nsa[node] = rng.randint(0, 3, nodes.actionSize) * nodes.Vs[node]
+            nodes.Qsa[node] = rng.randint(-1, 2, nodes.actionSize) / 2 * (nodes.Nsa[node] > 0)
+            nodes.Ns[node] = np.sum(nodes.Nsa[node])
+            if i % 2:
+                mcts.addVirtualLoss(node, rng.choice(np.flatnonzero(nodes.Vs[node])))
+
+            ns = nodes.Ns[node] + mcts.VLs.get(node, 0)
+            cur_best, best_act = -float('inf'), -1
+            for a in range(nodes.actionSize):
+                if not nodes.Vs[node, a]:
+                    continue
+                n, q = float(nodes.Nsa[node, a]), float(nodes.Qsa[node, a])
+                vl = mcts.VLsa[node][a] if node in mcts.VLsa else 0
+                if vl:
+                    q = (n * q - vl) / (n + vl)
+                    n += vl
+                if n > 0:
+                    u = q + float(nodes.Ps[node, a]) * np.sqrt(ns) / (1 + n)
+                else:
+                    u = float(nodes.Ps[node, a]) * np.sqrt(ns + 1e-8)
+                if u > cur_best:
+                    cur_best, best_act = u, a
+
+            self.assertEqual(mcts.pickAction(node), best_act)
+
+    def test_advance_keeps_subtree(self):
+        nnet = DummyNNet(self.game)
+        mcts = MCTS(self.game, nnet, dotdict({'numMCTSSims': 50, 'cpuct': 1.0}))
+        action = int(np.argmax(mcts.getActionProb(self.board, temp=0)))
+        board, player = self.game.getNextState(self.board, 1, action)
+        board = self.game.getCanonicalForm(board, player)
+        counts = self.rootCounts(mcts, board)
+        size = len(mcts.nodes)
+
+        mcts.advance(action)
+        self.assertLess(len(mcts.nodes), size)
+        self.assertEqual(mcts.getNode(board), 0)
+        np.testing.assert_array_equal(self.rootCounts(mcts, board), counts)
+
+        # the visits kept by advance count towards numMCTSSims
+        calls = nnet.predict_calls
+        mcts.getActionProb(board)
+        self.assertEqual(np.sum(self.rootCounts(mcts, board)), 49)
+        self.assertLessEqual(nnet.predict_calls - calls, 49 - np.sum(counts))
+
+    def test_advance_to_unexplored_move_clears_tree(self):
+        mcts = MCTS(self.game, DummyNNet(self.game), dotdict({'numMCTSSims': 2, 'cpuct': 1.0}))
+        probs = mcts.getActionProb(self.board, temp=1)
+        mcts.advance(probs.index(0))
+        self.assertEqual(len(mcts.nodes), 0)
+
+    def test_search_deeper_than_recursion_limit(self):
+        game = LineGame(300)
+        mcts = MCTS(game, DummyNNet(game), dotdict({'numMCTSSims': 400, 'cpuct': 1.0}))
+        self.addCleanup(sys.setrecursionlimit, sys.getrecursionlimit())
+        sys.setrecursionlimit(200)
+        mcts.getActionProb(game.getInitBoard())
+        self.assertGreater(len(mcts.nodes), 300)
+
+    def test_time_and_node_budgets(self):
+        args = dotdict({'numMCTSSims': 100000, 'cpuct': 1.0})
+        mcts = MCTS(self.game, DummyNNet(self.game), dotdict(args, maxTimeMs=50))
+        start = time.time()
+        mcts.getActionProb(self.board)
+        self.assertLess(time.time() - start, 1)
+        self.assertLess(mcts.lastNumSims, 100000)
+
+        # without any visit the prior decides
+        mcts = MCTS(self.game, DummyNNet(self.game), dotdict(args, maxTimeMs=0))
+        probs = mcts.getActionProb(self.board)
+        self.assertEqual(mcts.lastNumSims, 0)
+        np.testing.assert_allclose(probs, mcts.nodes.Ps[mcts.getNode(self.board)], rtol=1e-6)
+
+        mcts = MCTS(self.game, DummyNNet(self.game), dotdict(args, maxNodes=30))
+        mcts.getActionProb(self.board)
+        self.assertEqual(len(mcts.nodes), 1 + 30)  # the root and 30 new nodes
+        self.assertEqual(np.sum(self.rootCounts(mcts)) + 1, mcts.lastNumSims)
+
+    def test_early_stopping_keeps_best_action(self):
+        board, player = self.game.getInitBoard(), 1
+        for action in [0, 3, 1, 4]:
+            board, player = self.game.getNextState(board, player, action)
+        board = self.game.getCanonicalForm(board, player)
+
+        args = dotdict({'numMCTSSims': 400, 'cpuct': 1.0})
+        full = MCTS(self.game, DummyNNet(self.game), args).getActionProb(board, temp=0)
+        mcts = MCTS(self.game, DummyNNet(self.game), dotdict(args, earlyStopping=True))
+        self.assertEqual(mcts.getActionProb(board, temp=0), full)
+        self.assertLess(mcts.lastNumSims, 400)
+
+        # early stopping leaves the training targets (temp=1) alone
+        mcts.getActionProb(board, temp=1)
+        self.assertEqual(mcts.lastNumSims, 400)
+
+    def test_symmetric_boards_share_nodes(self):
+        args = dotdict({'numMCTSSims': 200, 'cpuct': 1.0, 'symmetries': True})
+        mcts = MCTS(self.game, DummyNNet(self.game), args)
+        mcts.getActionProb(self.board)
+        # every first move is a corner, an edge or the centre
+        children = mcts.nodes.children[mcts.getNode(self.board)]
+        self.assertEqual(len(set(children[children >= 0])), 3)
+
+        # a board without symmetries of its own, so every form is a different board
+        board = self.game.getNextState(self.board, 1, 0)[0]
+        board = self.game.getNextState(board, -1, 1)[0]
+        probs = MCTS(self.game, DummyNNet(self.game), args).getActionProb(board)
+        for symBoard, symProbs in self.game.getSymmetries(board, probs):
+            mcts = MCTS(self.game, DummyNNet(self.game), args)
+            np.testing.assert_allclose(mcts.getActionProb(symBoard), symProbs)
+
+    def test_advance_follows_symmetric_boards(self):
+        args = dotdict({'numMCTSSims': 50, 'cpuct': 1.0, 'symmetries': True})
+        mcts = MCTS(self.game, DummyNNet(self.game), args)
+        board, player = self.board, 1
+        for action in [0, 2, 8]:
+            probs = mcts.getActionProb(self.game.getCanonicalForm(board, player))
+            self.assertGreater(probs[action], 0)
+            mcts.advance(action)
+            board, player = self.game.getNextState(board, player, action)
+            self.assertIsNotNone(mcts.root)
+
+        canonicalBoard = self.game.getCanonicalForm(board, player)
+        kept = mcts.nodes.Ns[mcts.root]
+        probs = mcts.getActionProb(canonicalBoard)
+        self.assertEqual(mcts.lastNumSims, 50 - 1 - kept)
+        self.assertEqual(probs[0] + probs[2] + probs[8], 0)
+
+    def test_tree_limits_evict_nodes(self):
+        game = OthelloGame(6)
+        board = game.getInitBoard()
+        for limit in [{'maxTreeNodes': 100}, {'maxTreeBytes': 40000}]:
+            args = dotdict({'numMCTSSims': 1000, 'cpuct': 1.0}, **limit)
+            mcts = MCTS(game, DummyNNet(game), args)
+            mcts.getActionProb(board)
+            nodes = mcts.nodes
+
+            self.assertGreater(mcts.evictedNodes, 0)
+            self.assertEqual(mcts.createdNodes - mcts.evictedNodes, len(nodes))
+            self.assertLessEqual(len(nodes), limit.get('maxTreeNodes', len(nodes)))
+            self.assertLessEqual(nodes.nbytes(), limit.get('maxTreeBytes', nodes.nbytes()))
+            # the statistics of the kept nodes are untouched
+            root = mcts.getNode(board)
+            self.assertEqual(nodes.Ns[root], 999)
+            expanded = nodes.expanded[:len(nodes)]
+            np.testing.assert_array_equal(nodes.Ns[:len(nodes)][expanded], nodes.Nsa[:len(nodes)][expanded].sum(axis=1))
+
+    def test_gumbel_search(self):
+        board, player = self.game.getInitBoard(), 1
+        for action in [0, 3, 1, 4]:
+            board, player = self.game.getNextState(board, player, action)
+        board = self.game.getCanonicalForm(board, player)
+
+        args = dotdict({'numMCTSSims': 16, 'cpuct': 1.0, 'gumbel': True})
+        mcts = MCTS(self.game, DummyNNet(self.game), args)
+        self.assertEqual(mcts.getActionProb(board, temp=0).index(1), 2)
+        self.assertEqual(mcts.lastNumSims, 16)
+
+        # sequential halving only visits the considered actions
+        mcts = MCTS(self.game, DummyNNet(self.game), dotdict(args, gumbelMaxActions=4))
+        probs = mcts.getActionProb(board, temp=1)
+        counts = self.rootCounts(mcts, board)
+        self.assertEqual(np.sum(counts), 15)
+        self.assertLessEqual(np.count_nonzero(counts), 4)
+        self.assertGreater(counts[mcts.selectedAction], 0)
+        valids = self.game.getValidMoves(board, 1)
+        self.assertAlmostEqual(sum(probs), 1.0)
+        self.assertEqual(np.sum(np.asarray(probs)[valids == 0]), 0)
+
+    def test_pondering_player_searches_during_opponent_turn(self):
+        args = dotdict({'numMCTSSims': 20, 'cpuct': 1.0, 'maxPonderSims': 200})
+        player = PonderingMCTSPlayer(self.game, DummyNNet(self.game), args)
+        player.startGame()
+        action = player(self.board)
+        player.thread.join()  # the opponent thinks long enough for all of maxPonderSims
+        self.assertEqual(player.ponderedSims, 200)
+
+        board, curPlayer = self.game.getNextState(self.board, 1, action)
+        reply = int(np.argmax(player.mcts.nodes.Nsa[player.mcts.root]))
+        player.notify(board, reply)
+        board, curPlayer = self.game.getNextState(board, curPlayer, reply)
+        kept = player.mcts.nodes.Ns[player.mcts.root]
+        self.assertGreater(kept, 0)
+
+        player(self.game.getCanonicalForm(board, curPlayer))
+        self.assertEqual(player.mcts.lastNumSims, max(20 - 1 - kept, 0))
+        player.endGame()
+        self.assertIsNone(player.thread)
+
+    def test_pondering_player_called_twice_without_notify(self):
+        game = OthelloGame(6)
+        args = dotdict({'numMCTSSims': 20, 'cpuct': 1.0, 'maxPonderSims': 10 ** 6})
+        player = PonderingMCTSPlayer(game, DummyNNet(game), args)
+        errors = []
+        excepthook, threading.excepthook = threading.excepthook, errors.append
+        try:
+            player.startGame()
+            board, curPlayer = game.getInitBoard(), 1
+            for _ in range(8):
+                canonicalBoard = game.getCanonicalForm(board, curPlayer)
+                pondering = player.thread
+                action = player(canonicalBoard)
+                if pondering is not None:
+                    self.assertFalse(pondering.is_alive())
+                self.assertEqual(game.getValidMoves(canonicalBoard, 1)[action], 1)
+                board, curPlayer = game.getNextState(board, curPlayer, action)
+            player.endGame()
+        finally:
+            threading.excepthook = excepthook
+        self.assertEqual(errors, [])
+
+    def test_batch_size_one_is_sequential_search(self):
+        args = dotdict({'numMCTSSims': 50, 'cpuct': 1.0})
+        sequential = MCTS(self.game, DummyNNet(self.game), args)
+        sequential.getActionProb(self.board)
+
+        nnet = DummyNNet(self.game)
+        batched = MCTS(self.game, nnet, dotdict(args, mctsBatchSize=1))
+        batched.getActionProb(self.board)
+
+        self.assertEqual(nnet.predict_batch_calls, 0)
+        np.testing.assert_array_equal(self.rootCounts(sequential), self.rootCounts(batched))
+
+
+
+class TestParallelMCTS(unittest.TestCase):
+
+    @staticmethod
+    def position(game, moves):
+        board, player = game.getInitBoard(), 1
+        for action in moves:
+            board, player = game.getNextState(board, player, action)
+        return game.getCanonicalForm(board, player)
+
+    def test_visit_distribution_matches_sequential_search(self):
+        # positions with a clear best move: a win in one, a forced block, a fork defence and an Othello midgame
+        cases = [(TicTacToeGame(), [0, 3, 1, 4], 0.1), (TicTacToeGame(), [0, 4, 1], 0.1),
+                 (TicTacToeGame(), [4, 0, 8, 2], 0.1), (OthelloGame(6), [8, 7], 0.2)]
+        for game, moves, maxDistance in cases:
+            board = self.position(game, moves)
+            args = dotdict({'numMCTSSims': 400, 'cpuct': 1.0})
+            sequential = np.array(MCTS(game, DummyNNet(game), args).getActionProb(board))
+
+            for numThreads in [2, 4]:
+                nnet = DummyNNet(game)
+                mcts = ParallelMCTS(game, nnet, dotdict(args, numMCTSThreads=numThreads))
+                parallel = np.array(mcts.getActionProb(board))
+
+                self.assertEqual(mcts.nodes.Ns[mcts.getNode(board)], 399)
+                self.assertFalse(mcts.VLs)
+                self.assertEqual(np.argmax(parallel), np.argmax(sequential))
+                self.assertLess(0.5 * np.sum(np.abs(parallel - sequential)), maxDistance)
+
+    def test_network_errors_reach_the_caller(self):
+        game = TicTacToeGame()
+        nnet = DummyNNet(game)
+
+        def predict_batch(boards):
+            raise ValueError('broken network')
+        nnet.predict_batch = predict_batch
+
+        mcts = ParallelMCTS(game, nnet, dotdict({'numMCTSSims': 50, 'cpuct': 1.0, 'numMCTSThreads': 4}))
+        with self.assertRaises(ValueError):
+            mcts.getActionProb(game.getInitBoard())
+
+
+    def test_root_parallel_search_reuses_pool(self):
+        game = TicTacToeGame()
+        args = dotdict({'numMCTSSims': 100, 'cpuct': 1.0, 'numMCTSWorkers': 2})
+        mcts = RootParallelMCTS(game, DummyNNet, None, None, args)
+        self.addCleanup(mcts.close)
+        pool = mcts.pool
+
+        # X wins by playing 2, O has to block 2
+        for moves in [[0, 3, 1, 4], [0, 4, 1]]:
+            probs = mcts.getActionProb(self.position(game, moves), temp=0)
+            self.assertEqual(probs.index(1), 2)
+        self.assertIs(mcts.pool, pool)
+        self.assertAlmostEqual(sum(mcts.getActionProb(game.getInitBoard(), temp=1)), 1.0)
+
+
+
+class TestCachedNNet(unittest.TestCase):
+
+    def setUp(self):
+        self.game = TicTacToeGame()
+        self.args = dotdict({'numMCTSSims': 50, 'cpuct': 1.0})
+
+    def test_cache_is_shared_between_searches(self):
+        nnet = DummyNNet(self.game)
+        cached = CachedNNet(self.game, nnet, 1000)
+        board = self.game.getInitBoard()
+        probs = MCTS(self.game, cached, self.args).getActionProb(board)
+        self.assertEqual(probs, MCTS(self.game, DummyNNet(self.game), self.args).getActionProb(board))
+
+        calls = nnet.predict_calls
+        self.assertEqual(MCTS(self.game, cached, self.args).getActionProb(board), probs)
+        self.assertEqual(nnet.predict_calls, calls)
+        self.assertEqual(cached.hits, cached.misses)
+        self.assertEqual(cached.hitRate(), 0.5)
+
+        # batched lookups only send the missing boards to the network
+        hits, misses = cached.hits, cached.misses
+        MCTS(self.game, cached, dotdict(self.args, mctsBatchSize=8)).getActionProb(board)
+        self.assertGreater(cached.hits, hits)
+        self.assertEqual(nnet.predict_batch_boards, cached.misses - misses)
+
+    def test_least_recently_used_boards_are_evicted(self):
+        nnet = DummyNNet(self.game)
+        cached = CachedNNet(self.game, nnet, 10)
+        MCTS(self.game, cached, self.args).getActionProb(self.game.getInitBoard())
+        self.assertEqual(len(cached.cache), 10)
+        self.assertEqual(cached.evictions, cached.misses - 10)
+
+    def test_weight_changes_clear_the_cache(self):
+        cached = CachedNNet(self.game, DummyNNet(self.game), 1000)
+        MCTS(self.game, cached, self.args).getActionProb(self.game.getInitBoard())
+        self.assertTrue(cached.cache)
+        cached.train([])
+        self.assertFalse(cached.cache)
+
+        MCTS(self.game, cached, self.args).getActionProb(self.game.getInitBoard())
+        cached.load_checkpoint('folder', 'filename')
+        self.assertFalse(cached.cache)
+
+
+
+class TestZobrist(unittest.TestCase):
+
+    def test_updated_keys_match_and_do_not_collide(self):
+        games = [TicTacToeGame(), OthelloGame(6), GobangGame(7, 4),
+                 Connect4Game(np_pieces=np.zeros((6, 7), dtype=int))]
+        for game in games:
+            rng = np.random.RandomState(0)
+            boards = {}  # key -> stringRepresentation
+            for _ in range(50):
+                board, player = game.getInitBoard(), 1
+                key = game.getHashKey(board)
+                while game.getGameEnded(board, player) == 0:
+                    canonicalBoard = game.getCanonicalForm(board, player)
+                    action = rng.choice(np.flatnonzero(game.getValidMoves(canonicalBoard, 1)))
+                    board, player = game.getNextState(board, player, action)
+                    nextBoard = game.getCanonicalForm(board, player)
+                    key = game.getHashKey(nextBoard, canonicalBoard, key, action)
+                    self.assertEqual(key, game.getHashKey(nextBoard))
+                    s = game.stringRepresentation(nextBoard)
+                    self.assertEqual(boards.setdefault(key, s), s)
+            self.assertGreater(len(boards), 200)
+
+    def test_search_uses_hash_keys(self):
+        game = OthelloGame(6)
+        args = dotdict({'numMCTSSims': 100, 'cpuct': 1.0})
+        mcts = MCTS(game, DummyNNet(game), args)
+        mcts.getActionProb(game.getInitBoard())
+        self.assertTrue(all(isinstance(s, int) for s in mcts.nodes.keys))
+        np.testing.assert_array_equal(mcts.nodes.Nsa[mcts.getNode(game.getInitBoard())],
+                                      referenceSearch(game, DummyNNet(game), game.getInitBoard(), 100))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,56 @@
+"""
+Tests for PrefetchLoader.py, which needs PyTorch:
+
+    python -m pytest test_prefetch_loader.py
+"""
+
+import threading
+import unittest
+
+import numpy as np
+import torch
+
+from PrefetchLoader import PrefetchLoader
+from ReplayBuffer import DedupExamples
+
+
+def randomExamples(n):
+    rng = np.random.RandomState(0)
+    return [(rng.randint(-1, 2, size=(3, 3)), list(rng.dirichlet(np.ones(10))), rng.choice([-1, 1])) for _ in range(n)]
+
+
+class TestPrefetchLoader(unittest.TestCase):
+
+    def test_batches_are_float32_tensors(self):
+        examples = randomExamples(100)
+        loader = PrefetchLoader(examples, 8, 13, numWorkers=3)
+        batches = list(loader)
+        self.assertEqual(len(batches), 13)
+        boards, pis, vs, ws = batches[0]
+        self.assertEqual((boards.shape, pis.shape, vs.shape), ((8, 3, 3), (8, 10), (8,)))
+        self.assertEqual((boards.dtype, pis.dtype, vs.dtype), (torch.float32,) * 3)
+        self.assertIsNone(ws)
+        # every row is one of the examples
+        boardSet = {np.asarray(board, dtype=np.float32).tobytes() for board, _, _ in examples}
+        for board in boards:
+            self.assertIn(board.numpy().tobytes(), boardSet)
+
+    def test_batches_carry_weights(self):
+        dedup = DedupExamples(randomExamples(100))
+        boards, pis, vs, ws = next(iter(PrefetchLoader(dedup, 8, 1)))
+        self.assertEqual((ws.shape, ws.dtype), ((8,), torch.float32))
+
+    def test_errors_reach_the_training_loop(self):
+        with self.assertRaises(ValueError):
+            list(PrefetchLoader([(np.zeros(2), [1.], 0), (np.zeros(3), [1.], 0)], 8, 5))
+
+    def test_stopping_early_stops_the_workers(self):
+        threads = threading.active_count()
+        for i, batch in enumerate(PrefetchLoader(randomExamples(100), 8, 1000, numWorkers=2, prefetch=2)):
+            if i == 3:
+                break
+        self.assertEqual(threading.active_count(), threads)
+
+
+if __name__ == '__main__':
+    unittest.main()
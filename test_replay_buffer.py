@@ -0,0 +1,186 @@
+"""
+Tests for ReplayBuffer.py and its use by Coach:
+
+    python -m pytest test_replay_buffer.py
+"""
+
+import os
+import tempfile
+import unittest
+from collections import deque
+
+import numpy as np
+
+from Coach import Coach
+from othello.OthelloGame import OthelloGame
+from ReplayBuffer import DedupExamples, ReplayArrays, ReplayBuffer, Shard, SymmetricExamples
+from test_mcts import DummyNNet
+from tictactoe.TicTacToeGame import TicTacToeGame
+from utils import *
+
+
+def randomExamples(rng, n):
+    boards = rng.randint(-1, 2, size=(n, 3, 3)).astype(np.float64)
+    pis = rng.dirichlet(np.ones(10), size=n)
+    vs = rng.choice([-1, 1, 1e-4, -1e-4], size=n)
+    return [(board, list(pi), v) for board, pi, v in zip(boards, pis, vs)]
+
+
+class TestReplayBuffer(unittest.TestCase):
+
+    def test_shards_store_compact_examples(self):
+        rng = np.random.RandomState(0)
+        examples = randomExamples(rng, 50)
+        buffer = ReplayBuffer(tempfile.mkdtemp())
+        first = buffer.addShard(examples)
+        second = buffer.addShard(examples[:10])
+        self.assertEqual(buffer.shards(), [first.prefix, second.prefix])
+
+        shard = Shard(first.prefix)
+        self.assertEqual(len(shard), 50)
+        self.assertEqual((shard.boards.dtype, shard.pis.dtype, shard.vs.dtype), (np.int8, np.float16, np.int8))
+        for (board, pi, v), (board2, pi2, v2) in zip(examples, shard):
+            np.testing.assert_array_equal(board, board2)
+            np.testing.assert_allclose(pi, pi2, atol=1e-3)
+            self.assertEqual(np.rint(v), v2)  # draws become 0
+        # 9 bytes per board, 20 per policy, 1 per value, and the .npy headers
+        self.assertEqual(shard.nbytes(), 50 * 30 + 3 * 128)
+
+        buffer.removeShard(first.prefix)
+        self.assertEqual(buffer.shards(), [second.prefix])
+
+    def test_replay_arrays_read_batches_by_index(self):
+        rng = np.random.RandomState(0)
+        buffer = ReplayBuffer(tempfile.mkdtemp())
+        shards = [buffer.addShard(randomExamples(rng, n)) for n in [5, 1, 7]]
+        arrays = ReplayArrays(shards)
+        examples = [example for shard in shards for example in shard]
+        self.assertEqual(len(arrays), 13)
+        self.assertEqual(len(list(arrays)), 13)
+
+        ids = [12, 0, 5, 5, 6, 4]
+        boards, pis, vs = arrays.batch(ids)
+        self.assertEqual((pis.dtype, vs.dtype), (np.float32, np.float32))
+        for i, board, pi, v in zip(ids, boards, pis, vs):
+            np.testing.assert_array_equal(arrays[i][0], examples[i][0])
+            np.testing.assert_array_equal(board, examples[i][0])
+            np.testing.assert_array_equal(pi, examples[i][1])
+            self.assertEqual(v, examples[i][2])
+
+    def test_replay_arrays_keep_wider_boards_of_later_shards(self):
+        rng = np.random.RandomState(0)
+        buffer = ReplayBuffer(tempfile.mkdtemp())
+        narrow = buffer.addShard(randomExamples(rng, 3))
+        wide = buffer.addShard([(np.full((3, 3), 300.0), pi, v) for _, pi, v in randomExamples(rng, 2)])
+        self.assertEqual((narrow.boards.dtype, wide.boards.dtype), (np.int8, np.float64))
+
+        boards, _, _ = ReplayArrays([narrow, wide]).batch([0, 3, 4])
+        np.testing.assert_array_equal(boards[0], narrow.boards[0])
+        np.testing.assert_array_equal(boards[1:], 300)
+
+    def test_symmetric_examples_are_the_expanded_examples(self):
+        game = OthelloGame(6)
+        rng = np.random.RandomState(0)
+        examples = [(rng.randint(-1, 2, size=(6, 6)), rng.dirichlet(np.ones(game.getActionSize())), v) for v in [1, -1]]
+        expanded = [(symBoard, symPi, v) for board, pi, v in examples for symBoard, symPi in game.getSymmetries(board, pi)]
+
+        symmetric = SymmetricExamples(game, examples)
+        self.assertEqual(len(symmetric), 16)
+        for (board, pi, v), (board2, pi2, v2) in zip(expanded, symmetric):
+            np.testing.assert_array_equal(board, board2)
+            np.testing.assert_array_equal(pi, pi2)
+            self.assertEqual(v, v2)
+        ids = rng.randint(16, size=40)
+        boards, pis, vs = symmetric.batch(ids)
+        for i, board, pi, v in zip(ids, boards, pis, vs):
+            np.testing.assert_array_equal(board, expanded[i][0])
+            np.testing.assert_array_equal(pi, expanded[i][1])
+            self.assertEqual(v, expanded[i][2])
+
+    def test_symmetric_examples_need_permutations(self):
+        class ScaledGame(TicTacToeGame):
+            def getSymmetries(self, board, pi):
+                return [(board, pi), (2 * board, pi)]
+
+        with self.assertRaises(ValueError):
+            SymmetricExamples(ScaledGame(), [])
+
+    def test_dedup_averages_duplicate_positions(self):
+        game = TicTacToeGame()
+        empty, corner = np.zeros((3, 3)), np.zeros((3, 3))
+        corner[0, 0] = 1
+        pi1, pi2 = np.eye(10)[4], np.eye(10)[0]
+        examples = [(empty, pi1, 1), (corner, pi2, -1), (empty.copy(), pi2, -1), (empty.copy(), pi2, -1)]
+        dedup = DedupExamples(examples)
+
+        self.assertEqual((len(dedup), dedup.numRaw), (2, 4))
+        np.testing.assert_array_equal(dedup.counts, [3, 1])
+        # the weights keep the share of the loss of every position
+        np.testing.assert_allclose(dedup.weights, [1.5, 0.5])
+        board, pi, v = dedup[0]
+        np.testing.assert_array_equal(board, empty)
+        np.testing.assert_allclose(pi, (pi1 + 2 * pi2) / 3)
+        self.assertAlmostEqual(v, -1 / 3)
+        boards, pis, vs = dedup.batch(np.array([1, 0]))
+        np.testing.assert_array_equal(boards[0], corner)
+        np.testing.assert_allclose(vs, [-1, -1 / 3])
+
+        # every symmetric form of a merged example has its weight
+        np.testing.assert_allclose(SymmetricExamples(game, dedup).weights, np.repeat([1.5, 0.5], 8))
+
+    def test_dedup_indexes_the_replay_arrays(self):
+        rng = np.random.RandomState(0)
+        positions = rng.randint(-1, 2, size=(30, 3, 3))
+        examples = [(positions[i], list(rng.dirichlet(np.ones(10))), rng.choice([-1, 1]))
+                    for i in rng.randint(30, size=200)]
+        buffer = ReplayBuffer(tempfile.mkdtemp())
+        arrays = ReplayArrays([buffer.addShard(examples[:120]), buffer.addShard(examples[120:])])
+        expected, dedup = DedupExamples(examples), DedupExamples(arrays, chunkSize=64)
+
+        self.assertEqual((len(dedup), dedup.numRaw), (30, 200))
+        np.testing.assert_array_equal(dedup.counts, expected.counts)
+        ids = rng.randint(30, size=50)
+        for x, y in zip(dedup.batch(ids), expected.batch(ids)):
+            np.testing.assert_allclose(x, y, atol=1e-3)
+        # just the index of the rows is kept, the examples stay in the shards
+        self.assertIs(dedup.examples, arrays)
+        self.assertLessEqual(max(x.nbytes for x in vars(dedup).values() if isinstance(x, np.ndarray)), 8 * 200)
+
+    def test_coach_dedups_for_weighted_networks_only(self):
+        game = TicTacToeGame()
+        args = dotdict({'dedupExamples': True})
+        rng = np.random.RandomState(0)
+        for weightedTraining in [False, True]:
+            nnet = DummyNNet(game)
+            nnet.weightedTraining = weightedTraining
+            coach = Coach(game, nnet, args)
+            coach.trainExamplesHistory = [deque(randomExamples(rng, 20))]
+            self.assertEqual(isinstance(coach.getTrainExamples(), DedupExamples), weightedTraining)
+
+    def test_coach_writes_each_iteration_once(self):
+        folder = tempfile.mkdtemp()
+        game = TicTacToeGame()
+        args = dotdict({'checkpoint': folder, 'replayShards': True, 'numItersForTrainExamplesHistory': 2,
+                        'load_folder_file': (folder, 'best.pth.tar')})
+        coach = Coach(game, DummyNNet(game), args)
+        rng = np.random.RandomState(0)
+        for i in range(3):
+            coach.trainExamplesHistory.append(deque(randomExamples(rng, 20 + i)))
+            if len(coach.trainExamplesHistory) > args.numItersForTrainExamplesHistory:
+                coach.trainExamplesHistory.pop(0)
+            coach.saveTrainExamples(i)
+            coach.saveTrainExamples(i)  # nothing new to write
+        self.assertEqual([len(e) for e in coach.trainExamplesHistory], [21, 22])
+        self.assertEqual(len(os.listdir(os.path.join(folder, 'replay'))), 2 * 3)
+
+        resumed = Coach(game, DummyNNet(game), args)
+        resumed.loadTrainExamples()
+        self.assertTrue(resumed.skipFirstSelfPlay)
+        self.assertEqual([e.prefix for e in resumed.trainExamplesHistory],
+                         [e.prefix for e in coach.trainExamplesHistory])
+        self.assertIsInstance(resumed.getTrainExamples(), ReplayArrays)
+        self.assertEqual(len(resumed.getTrainExamples()), 21 + 22)
+
+
+if __name__ == '__main__':
+    unittest.main()
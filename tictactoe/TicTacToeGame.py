@@ -3,6 +3,7 @@ import sys
 sys.path.append('..')
 from Game import Game
 from .TicTacToeLogic import Board
+from utils import Zobrist
 import numpy as np
 
 """
@@ -17,6 +18,7 @@ Based on the OthelloGame by Surag Nair.
 class TicTacToeGame(Game):
     def __init__(self, n=3):
         self.n = n
+        self.zobrist = Zobrist(n * n)
 
     def getInitBoard(self):
         # return initial board (numpy board)
@@ -94,6 +96,13 @@ class TicTacToeGame(Game):
         # 8x8 numpy array (canonical board)
         return board.tostring()
 
+    def getHashKey(self, board, parentBoard=None, parentKey=None, action=None):
+        if parentKey is None:
+            return self.zobrist.key(board)
+        # a move only fills the cell of action, a pass changes no cell
+        cells = [action] if action < self.n * self.n else []
+        return self.zobrist.nextKey(parentKey, cells, parentBoard, board)
+
     @staticmethod
     def display(board):
         n = board.shape[0]
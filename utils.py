@@ -1,3 +1,6 @@
+import numpy as np
+
+
 class AverageMeter(object):
     """From https://github.com/pytorch/examples/blob/master/imagenet/main.py"""
 
@@ -20,3 +23,46 @@ class AverageMeter(object):
 class dotdict(dict):
     def __getattr__(self, name):
         return self[name]
+
+
+class Zobrist(object):
+    """
+    Zobrist keys of boards whose cells hold 1, -1 or 0 (empty), for
+    Game.getHashKey. A key packs the 64-bit Zobrist keys of the board and of
+    its colour-swapped form (-board), so that the key of the next canonical
+    board, whose colours getCanonicalForm swaps, can be updated from the key
+    of the previous one by touching only the cells that changed.
+    """
+
+    def __init__(self, numCells, seed=0):
+        rng = np.random.RandomState(seed)
+        table = rng.randint(0, 2 ** 63, size=(numCells, 2), dtype=np.int64)
+        # piece (1, 0 or -1) at cell c -> table[c][piece], 0 for empty cells
+        self.table = [{1: int(plus), -1: int(minus), 0: 0} for plus, minus in table]
+
+    def key(self, board):
+        """
+        Returns the key of board, computed from scratch.
+        """
+        key = swapped = 0
+        table = self.table
+        for c, piece in enumerate(np.ravel(board).tolist()):
+            key ^= table[c][piece]
+            swapped ^= table[c][-piece]
+        return key << 64 | swapped
+
+    def nextKey(self, parentKey, cells, parentBoard, board):
+        """
+        Returns the key of board, the canonical board (with the colours
+        swapped) after a move on parentBoard that changed only the given
+        cells (flat indices).
+        """
+        key, swapped = parentKey >> 64, parentKey & 0xFFFFFFFFFFFFFFFF
+        table = self.table
+        for c in cells:
+            # the board after the move is -board in the colours of parentBoard
+            before, after = parentBoard.item(c), -board.item(c)
+            key ^= table[c][before] ^ table[c][after]
+            swapped ^= table[c][-before] ^ table[c][-after]
+        # the new board has the colours swapped
+        return swapped << 64 | key